@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+from common import create_tables, run_load, setup_environment
+
+DAY = 24 * 60 * 60
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Seed a large dataset spread over time, then report list and "
+        "permalink latency and the ranking index rebuild time before and after "
+        "archiving the old contents, as JSON."
+    )
+    parser.add_argument("--contents", type=int, default=100000)
+    parser.add_argument(
+        "--days", type=int, default=730, help="the contents are spread over these"
+    )
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument(
+        "--max-page", type=int, default=50, help="pages are read from 1 to this"
+    )
+    parser.add_argument("--database", help="SQLite file to use (default: temp)")
+    parser.add_argument("--output", help="write the JSON report here")
+    return parser.parse_args()
+
+
+async def seed(num_contents: int, days: int) -> list[str]:
+    import ulid
+    from sqlalchemy import insert
+
+    from core.constants import AI_MODEL, TEMPERATURE
+    from core.db_settings import get_db_session
+    from models.sqlmodels.content_view import ContentView
+    from models.sqlmodels.input import Input
+    from models.sqlmodels.paraphrase import Paraphrase
+    from repositories.content import render_view_payload
+
+    now = time.time()
+    content_ids = []
+    chunk_size = 5000
+    for start in range(0, num_contents, chunk_size):
+        inputs = []
+        paraphrases = []
+        views = []
+        for i in range(start, min(start + chunk_size, num_contents)):
+            timestamp = now - random.random() * days * DAY
+            created_at = datetime.utcfromtimestamp(int(timestamp))
+            content_id = ulid.from_timestamp(timestamp).str.lower()
+            # most contents get no votes, a few get many
+            vote_counts = [int(random.paretovariate(1.2)) - 1 for _ in range(3)]
+            inputs.append(
+                {
+                    "id": content_id,
+                    "who": "上司",
+                    "what": "締め切りを延ばしてほしい",
+                    "detail": f"ベンチマーク用の入力 {i}",
+                    "vote_count": sum(vote_counts),
+                    "created_at": created_at,
+                    "updated_at": created_at,
+                }
+            )
+            # the paraphrase ids of a content count up, as create_content makes them
+            first_paraphrase_id = ulid.from_timestamp(timestamp).int
+            for j, vote_count in enumerate(vote_counts):
+                paraphrases.append(
+                    {
+                        "id": ulid.from_int(first_paraphrase_id + j).str.lower(),
+                        "input_id": content_id,
+                        "content": f"言い換え{i}-{j}",
+                        "vote_count": vote_count,
+                        "ai_model": AI_MODEL,
+                        "temperature": TEMPERATURE,
+                        "created_at": created_at,
+                        "updated_at": created_at,
+                    }
+                )
+            views.append(
+                {
+                    "id": content_id,
+                    "payload": render_view_payload(
+                        "上司",
+                        "締め切りを延ばしてほしい",
+                        f"ベンチマーク用の入力 {i}",
+                        [
+                            (paraphrase["id"], paraphrase["content"])
+                            for paraphrase in paraphrases[-len(vote_counts) :]
+                        ],
+                    ),
+                    "created_at": created_at,
+                }
+            )
+            content_ids.append(content_id)
+        async with get_db_session() as session:
+            await session.execute(insert(Input.__table__), inputs)
+            await session.execute(insert(Paraphrase.__table__), paraphrases)
+            await session.execute(insert(ContentView.__table__), views)
+            await session.commit()
+    return content_ids
+
+
+async def count_rows() -> dict[str, int]:
+    from sqlalchemy import func, select
+
+    from core.db_settings import get_db_session
+    from models.sqlmodels import ArchivedInput, ArchivedParaphrase, Input, Paraphrase
+
+    counts = {}
+    async with get_db_session() as session:
+        for model in (Input, Paraphrase, ArchivedInput, ArchivedParaphrase):
+            counts[model.__tablename__] = await session.scalar(
+                select(func.count()).select_from(model)
+            )
+    return counts
+
+
+async def run(args: argparse.Namespace) -> dict:
+    import httpx
+
+    from main import app
+    from services.archiver import content_archiver
+    from services.ranking_index import ranking_index
+
+    await create_tables()
+    seed_started_at = time.perf_counter()
+    content_ids = await seed(args.contents, args.days)
+    seed_seconds = time.perf_counter() - seed_started_at
+
+    transport = httpx.ASGITransport(app=app)
+    report: dict[str, dict] = {}
+    async with app.router.lifespan_context(app), httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark"
+    ) as client:
+
+        async def get_contents(index: int) -> bool:
+            response = await client.get(
+                "/contents/",
+                params={"page": random.randint(1, args.max_page), "per_page": 10},
+            )
+            return response.status_code == 200
+
+        async def get_contents_ranking(index: int) -> bool:
+            response = await client.get(
+                "/contents/",
+                params={
+                    "page": random.randint(1, args.max_page),
+                    "per_page": 10,
+                    "order_by": "ranking",
+                },
+            )
+            return response.status_code == 200
+
+        async def get_content(index: int) -> bool:
+            # old contents, which are archived in the second phase
+            response = await client.get(
+                f"/contents/{random.choice(content_ids[: len(content_ids) // 2])}/"
+            )
+            return response.status_code == 200
+
+        scenarios = {
+            "GET /contents/?order_by=latest": get_contents,
+            "GET /contents/?order_by=ranking": get_contents_ranking,
+            "GET /contents/{content_id}/ (old)": get_content,
+        }
+
+        async def measure() -> dict:
+            await ranking_index.rebuild()
+            results = {
+                "rows": await count_rows(),
+                "ranking_rebuild_s": round(ranking_index.last_rebuild_seconds, 4),
+            }
+            for name, send in scenarios.items():
+                result = await run_load(name, args.requests, args.concurrency, send)
+                results[name] = result.summary()
+            return results
+
+        # old contents first, so that get_content hits the archive afterwards
+        content_ids.sort()
+        report["before"] = await measure()
+        archived = await content_archiver.run_once()
+        report["archive_run"] = {
+            "archived": archived,
+            "duration_s": round(content_archiver.last_run_seconds, 4),
+        }
+        report["after"] = await measure()
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            "contents": args.contents,
+            "days": args.days,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "max_page": args.max_page,
+            "seed_s": round(seed_seconds, 4),
+        },
+        "results": report,
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    setup_environment(args.database)
+    # every page is read from the database, and the archiver only runs when
+    # it is called
+    os.environ.update(
+        PAGE_CACHE_SIZE="0", ARCHIVE_INTERVAL="0", ARCHIVE_BATCH_PAUSE="0"
+    )
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
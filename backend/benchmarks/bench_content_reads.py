@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from bench_archive import seed
+from common import create_tables, percentile, setup_environment
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Read content pages and permalinks from the content views, "
+        "with the column projection of the inputs and with ORM entities, and "
+        "report contents per second, latency and memory allocated per read as "
+        "JSON."
+    )
+    parser.add_argument("--contents", type=int, default=20000)
+    parser.add_argument("--reads", type=int, default=1000)
+    parser.add_argument("--per-page", type=int, default=10)
+    parser.add_argument(
+        "--max-page", type=int, default=50, help="pages are read from 1 to this"
+    )
+    parser.add_argument("--database", help="SQLite file to use (default: temp)")
+    parser.add_argument("--output", help="write the JSON report here")
+    return parser.parse_args()
+
+
+async def orm_contents_by_order(session, page: int, per_page: int, order_by):
+    # the previous read path: whole entities, registered in the identity map
+    from sqlalchemy import desc, select
+
+    from core.constants import OrderBy
+    from models.sqlmodels.input import Input
+
+    if order_by == OrderBy.ranking:
+        order_column = Input.vote_count
+    else:
+        order_column = Input.created_at
+    inputs = await session.scalars(
+        select(Input)
+        .where(Input.deleted_at.is_(None))
+        .order_by(desc(order_column), desc(Input.id))
+        .offset((page - 1) * per_page)
+        .limit(per_page + 1)
+    )
+    return await orm_build_contents(session, list(inputs.all())[:per_page])
+
+
+async def orm_contents_by_ids(session, content_ids: list[str]):
+    from sqlalchemy import select
+
+    from models.sqlmodels.input import Input
+
+    inputs = await session.scalars(
+        select(Input).where(Input.id.in_(content_ids)).where(Input.deleted_at.is_(None))
+    )
+    return await orm_build_contents(session, list(inputs.all()))
+
+
+async def orm_build_contents(session, inputs):
+    from sqlalchemy import select
+
+    from models.custom_types.content import ContentRow, ParaphraseRow
+    from models.sqlmodels.paraphrase import Paraphrase
+
+    paraphrases = await session.scalars(
+        select(Paraphrase)
+        .where(Paraphrase.input_id.in_([input.id for input in inputs]))
+        .order_by(Paraphrase.input_id, Paraphrase.id)
+    )
+    paraphrases_by_input_id = {}
+    for paraphrase in paraphrases:
+        paraphrases_by_input_id.setdefault(paraphrase.input_id, []).append(
+            ParaphraseRow(paraphrase.id, paraphrase.content, paraphrase.vote_count)
+        )
+    return [
+        ContentRow(
+            input.id,
+            input.who,
+            input.what,
+            input.detail,
+            paraphrases_by_input_id[input.id],
+        )
+        for input in inputs
+        if input.id in paraphrases_by_input_id
+    ]
+
+
+async def projection_latest_page(session, page: int, per_page: int):
+    # the column projection of the inputs that latest pages were read with
+    # before the content views
+    from sqlalchemy import desc
+
+    from models.sqlmodels.input import Input
+    from repositories.content import _build_contents, _select_inputs
+
+    table = Input.__table__
+    inputs = await session.execute(
+        _select_inputs(Input)
+        .order_by(desc(table.c.created_at), desc(table.c.id))
+        .offset((page - 1) * per_page)
+        .limit(per_page + 1)
+    )
+    return await _build_contents(session, list(inputs.all())[:per_page])
+
+
+async def projection_contents_by_ids(session, content_ids: list[str]):
+    from repositories.content import _get_input_contents_by_ids
+
+    return list((await _get_input_contents_by_ids(session, content_ids)).values())
+
+
+async def measure(read, num_reads: int) -> dict:
+    from core.db_settings import get_db_session
+
+    # a session per read, as per request
+    latencies = []
+    num_contents = 0
+    for _ in range(num_reads):
+        started_at = time.perf_counter()
+        async with get_db_session() as session:
+            num_contents += len(await read(session))
+        latencies.append(time.perf_counter() - started_at)
+
+    allocated = []
+    tracemalloc.start()
+    for _ in range(min(num_reads, 100)):
+        async with get_db_session() as session:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            await read(session)
+            allocated.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    total_seconds = sum(latencies)
+    latencies.sort()
+    return {
+        "reads": num_reads,
+        "contents_per_s": round(num_contents / total_seconds),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "peak_alloc_kb": round(sum(allocated) / len(allocated) / 1024, 1),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    from core.constants import OrderBy
+    from repositories.content import get_contents_by_ids, get_contents_by_order
+
+    await create_tables()
+    content_ids = await seed(args.contents, 365)
+
+    def random_page() -> int:
+        return random.randint(1, args.max_page)
+
+    def random_ids() -> list[str]:
+        return [random.choice(content_ids)]
+
+    # latest pages and permalinks are read from the content views, ranking
+    # pages from the column projection of the inputs
+    reads = {
+        "page (latest)": {
+            "orm": lambda session: orm_contents_by_order(
+                session, random_page(), args.per_page, OrderBy.latest
+            ),
+            "projection": lambda session: projection_latest_page(
+                session, random_page(), args.per_page
+            ),
+            "content_views": lambda session: get_contents_by_order(
+                session, random_page(), args.per_page, OrderBy.latest
+            ),
+        },
+        "page (ranking)": {
+            "orm": lambda session: orm_contents_by_order(
+                session, random_page(), args.per_page, OrderBy.ranking
+            ),
+            "projection": lambda session: get_contents_by_order(
+                session, random_page(), args.per_page, OrderBy.ranking
+            ),
+        },
+        "permalink": {
+            "orm": lambda session: orm_contents_by_ids(session, random_ids()),
+            "projection": lambda session: projection_contents_by_ids(
+                session, random_ids()
+            ),
+            "content_views": lambda session: get_contents_by_ids(session, random_ids()),
+        },
+    }
+
+    async def read_contents(read, session):
+        result = await read(session)
+        # get_contents_by_order also returns the next cursor
+        return result[0] if isinstance(result, tuple) else result
+
+    results = {}
+    for name, implementations in reads.items():
+        results[name] = {}
+        for implementation, read in implementations.items():
+            random.seed(1)
+            results[name][implementation] = await measure(
+                lambda session, read=read: read_contents(read, session), args.reads
+            )
+    return results
+
+
+def main() -> None:
+    args = parse_args()
+    setup_environment(args.database)
+    random.seed(0)
+    results = asyncio.run(run(args))
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            "contents": args.contents,
+            "reads": args.reads,
+            "per_page": args.per_page,
+            "max_page": args.max_page,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+from datetime import datetime, timezone
+
+from common import FakeOpenAI, create_tables, run_load, setup_environment
+
+SCENARIOS = [
+    "iikae",
+    "iikae_degraded",
+    "iikae_similar",
+    "vote",
+    "vote_duplicates",
+    "contents",
+    "contents_ranking",
+    "contents_hot",
+    "content",
+    "contents_batch",
+    "contents_search",
+]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Drive the API in process against SQLite with a fake LLM "
+        "and report throughput and latency percentiles as JSON."
+    )
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument(
+        "--llm-latency", type=float, default=0.5, help="seconds per completion"
+    )
+    parser.add_argument(
+        "--degraded-llm-latency",
+        type=float,
+        help="seconds per completion in the iikae_degraded scenario "
+        "(default: 10x --llm-latency)",
+    )
+    parser.add_argument(
+        "--seed-contents",
+        type=int,
+        default=200,
+        help="contents created before the read benchmarks",
+    )
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--database", help="SQLite file to use (default: temp)")
+    parser.add_argument("--output", help="write the JSON report here")
+    return parser.parse_args()
+
+
+async def run(args: argparse.Namespace) -> dict:
+    import httpx
+
+    import services.generation
+    from main import app
+    from services.vote_dedupe import vote_deduplicator
+
+    await create_tables()
+    degraded_latency = args.degraded_llm_latency or args.llm_latency * 10
+    fake_openai = FakeOpenAI(args.llm_latency)
+    services.generation.client = fake_openai
+
+    transport = httpx.ASGITransport(app=app)
+    results: dict[str, dict] = {}
+    async with app.router.lifespan_context(app), httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark"
+    ) as client:
+        content_ids: list[str] = []
+        paraphrase_ids: list[str] = []
+
+        async def post_iikae(index: int) -> bool:
+            response = await client.post(
+                "/iikae/",
+                json={
+                    "who": "上司",
+                    "what": "締め切りを延ばしてほしい",
+                    # random kanji, so that no two are similar enough to be
+                    # answered with each other's paraphrases
+                    "detail": "ベンチマーク用の入力 "
+                    + "".join(chr(random.randint(0x4E00, 0x9FFF)) for _ in range(12)),
+                },
+            )
+            if response.status_code != 200:
+                return False
+            content = response.json()["content"]
+            content_ids.append(content["content_id"])
+            paraphrase_ids.extend(p["paraphrase_id"] for p in content["paraphrases"])
+            return True
+
+        seed = await run_load("seed", args.seed_contents, args.concurrency, post_iikae)
+        if seed.errors:
+            raise RuntimeError(f"{seed.errors} seed requests failed")
+
+        async def post_iikae_similar(index: int) -> bool:
+            # variations of a few requests, as users resubmit them
+            response = await client.post(
+                "/iikae/",
+                json={
+                    "who": "上司",
+                    "what": random.choice(["", "少し"]) + "締め切りを延ばしてほしい",
+                    "detail": f"来週の会議の資料{index % 5}が間に合わない"
+                    + random.choice(["", "。", "！"]),
+                },
+            )
+            return response.status_code == 200
+
+        async def vote(index: int) -> bool:
+            # every vote from a different client, so that all of them count
+            response = await client.post(
+                "/vote/",
+                json={"paraphrase_id": random.choice(paraphrase_ids)},
+                headers={"X-Forwarded-For": f"10.0.{index // 256 % 256}.{index % 256}"},
+            )
+            return response.status_code == 200
+
+        async def vote_duplicates(index: int) -> bool:
+            # a few clients voting for a few paraphrases over and over
+            response = await client.post(
+                "/vote/",
+                json={"paraphrase_id": random.choice(paraphrase_ids[:5])},
+                headers={"X-Forwarded-For": f"10.1.0.{random.randrange(5)}"},
+            )
+            return response.status_code == 200
+
+        async def get_contents(index: int) -> bool:
+            response = await client.get(
+                "/contents/", params={"page": index % 5 + 1, "per_page": 10}
+            )
+            return response.status_code == 200
+
+        async def get_contents_ranking(index: int) -> bool:
+            response = await client.get(
+                "/contents/",
+                params={"page": index % 5 + 1, "per_page": 10, "order_by": "ranking"},
+            )
+            return response.status_code == 200
+
+        async def get_contents_hot(index: int) -> bool:
+            response = await client.get(
+                "/contents/",
+                params={"page": index % 5 + 1, "per_page": 10, "order_by": "hot"},
+            )
+            return response.status_code == 200
+
+        async def get_content(index: int) -> bool:
+            response = await client.get(f"/contents/{random.choice(content_ids)}/")
+            return response.status_code == 200
+
+        async def get_contents_batch(index: int) -> bool:
+            ids = random.sample(content_ids, min(len(content_ids), 10))
+            response = await client.get(
+                "/contents/batch/", params={"ids": ",".join(ids)}
+            )
+            return response.status_code == 200
+
+        async def search_contents(index: int) -> bool:
+            response = await client.get(
+                "/contents/search/",
+                params={"q": random.choice(["締め切り", "上司", "延ばして"])},
+            )
+            return response.status_code == 200
+
+        scenarios = {
+            "iikae": ("POST /iikae/", post_iikae),
+            # shed requests count as errors, so the latencies are of the
+            # admitted ones
+            "iikae_degraded": ("POST /iikae/ (degraded LLM)", post_iikae),
+            "iikae_similar": ("POST /iikae/ (similar requests)", post_iikae_similar),
+            "vote": ("POST /vote/", vote),
+            "vote_duplicates": ("POST /vote/ (repeated votes)", vote_duplicates),
+            "contents": ("GET /contents/?order_by=latest", get_contents),
+            "contents_ranking": (
+                "GET /contents/?order_by=ranking",
+                get_contents_ranking,
+            ),
+            "contents_hot": ("GET /contents/?order_by=hot", get_contents_hot),
+            "content": ("GET /contents/{content_id}/", get_content),
+            "contents_batch": ("GET /contents/batch/?ids=(10)", get_contents_batch),
+            "contents_search": ("GET /contents/search/?q=", search_contents),
+        }
+        for scenario in args.scenarios:
+            name, send = scenarios[scenario]
+            if scenario == "iikae_degraded":
+                fake_openai.completions.latency = degraded_latency
+            calls = fake_openai.completions.calls
+            rejected = vote_deduplicator.rejected
+            result = await run_load(name, args.requests, args.concurrency, send)
+            fake_openai.completions.latency = args.llm_latency
+            results[name] = dict(
+                result.summary(),
+                llm_calls=fake_openai.completions.calls - calls,
+                duplicate_votes=vote_deduplicator.rejected - rejected,
+            )
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "llm_latency_s": args.llm_latency,
+            "degraded_llm_latency_s": degraded_latency,
+            "seed_contents": args.seed_contents,
+        },
+        "llm_calls": fake_openai.completions.calls,
+        "vote_dedupe": vote_deduplicator.stats(),
+        "results": results,
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    setup_environment(args.database)
+    # the limiter backs off once completions take longer than this
+    os.environ.setdefault("GENERATION_LATENCY_TARGET", str(args.llm_latency * 4))
+    # reusing similar requests is off by default
+    os.environ.setdefault("SIMILARITY_THRESHOLD", "0.9")
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from common import percentile
+
+# the inputs and paraphrases tables with the id columns of each layout;
+# WITHOUT ROWID clusters the rows on the primary key, as InnoDB does
+SCHEMA = """
+CREATE TABLE inputs (
+    id {id_type} NOT NULL PRIMARY KEY,
+    who VARCHAR(200) NOT NULL,
+    what VARCHAR(500) NOT NULL,
+    detail VARCHAR(500) NOT NULL,
+    vote_count INTEGER NOT NULL,
+    created_at DATETIME,
+    deleted_at DATETIME
+) WITHOUT ROWID;
+CREATE TABLE paraphrases (
+    id {id_type} NOT NULL PRIMARY KEY,
+    input_id {id_type} NOT NULL REFERENCES inputs (id),
+    content VARCHAR(500) NOT NULL,
+    vote_count INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX ix_inputs_deleted_at_created_at_id ON inputs (deleted_at, created_at, id);
+CREATE INDEX ix_inputs_deleted_at_vote_count_id ON inputs (deleted_at, vote_count, id);
+CREATE INDEX ix_paraphrases_input_id ON paraphrases (input_id);
+"""
+LAYOUTS = {"varchar": "VARCHAR(33)", "binary": "BINARY(16)"}
+
+LATEST_PAGE = """
+SELECT i.id, i.who, i.what, i.detail, p.id, p.content
+FROM (
+    SELECT id, who, what, detail, created_at FROM inputs
+    WHERE deleted_at IS NULL
+    ORDER BY created_at DESC, id DESC
+    LIMIT 10 OFFSET ?
+) AS i
+JOIN paraphrases AS p ON p.input_id = i.id
+ORDER BY i.created_at DESC, i.id DESC, p.id
+"""
+FULL_JOIN = """
+SELECT count(*), sum(p.vote_count)
+FROM inputs AS i JOIN paraphrases AS p ON p.input_id = i.id
+WHERE i.deleted_at IS NULL
+"""
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Seed SQLite with the same contents keyed by VARCHAR and by "
+        "BINARY(16) ULIDs and report table and index sizes and join latency as "
+        "JSON."
+    )
+    parser.add_argument("--contents", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--output", help="write the JSON report here")
+    return parser.parse_args()
+
+
+def generate(num_contents: int) -> list[tuple[bytes, list[bytes], datetime]]:
+    import ulid
+
+    # a content every few seconds, so that the ids are in time order
+    started_at = datetime(2024, 3, 1)
+    contents = []
+    for i in range(num_contents):
+        created_at = started_at + timedelta(seconds=i * 5)
+        timestamp = created_at.replace(tzinfo=timezone.utc).timestamp()
+        input_id = ulid.from_timestamp(timestamp).bytes
+        paraphrase_ids = [ulid.from_timestamp(timestamp).bytes for _ in range(3)]
+        contents.append((input_id, sorted(paraphrase_ids), created_at))
+    return contents
+
+
+def seed(path: str, layout: str, contents: list) -> float:
+    from ulid import base32
+
+    if layout == "binary":
+        encode = bytes
+    else:
+
+        def encode(value: bytes) -> str:
+            return base32.encode_ulid(value).lower()
+
+    started_at = time.perf_counter()
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA.format(id_type=LAYOUTS[layout]))
+    connection.executemany(
+        "INSERT INTO inputs VALUES (?, ?, ?, ?, ?, ?, NULL)",
+        (
+            (
+                encode(input_id),
+                "上司",
+                "締め切りを延ばしてほしい",
+                "来週の会議の資料が間に合わない",
+                random.randrange(100),
+                created_at,
+            )
+            for input_id, _, created_at in contents
+        ),
+    )
+    connection.executemany(
+        "INSERT INTO paraphrases VALUES (?, ?, ?, ?)",
+        (
+            (encode(paraphrase_id), encode(input_id), "言い換え" * 10, 0)
+            for input_id, paraphrase_ids, _ in contents
+            for paraphrase_id in paraphrase_ids
+        ),
+    )
+    connection.commit()
+    connection.execute("ANALYZE")
+    connection.close()
+    return time.perf_counter() - started_at
+
+
+def sizes(connection: sqlite3.Connection) -> dict[str, float]:
+    # bytes of the pages of each table and index, in MiB
+    return {
+        name: round(size / 2**20, 2)
+        for name, size in connection.execute(
+            "SELECT name, sum(pgsize) FROM dbstat "
+            "WHERE name NOT LIKE 'sqlite_%' GROUP BY name ORDER BY name"
+        )
+    }
+
+
+def timed(connection: sqlite3.Connection, query: str, params_list: list) -> dict:
+    latencies = []
+    for params in params_list:
+        started_at = time.perf_counter()
+        connection.execute(query, params).fetchall()
+        latencies.append(time.perf_counter() - started_at)
+    latencies.sort()
+    return {
+        "queries": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    random.seed(0)
+    contents = generate(args.contents)
+    directory = tempfile.mkdtemp()
+    results = {}
+    for layout in LAYOUTS:
+        path = os.path.join(directory, f"{layout}.db")
+        seed_seconds = seed(path, layout, contents)
+        connection = sqlite3.connect(path)
+        page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+        page_count = connection.execute("PRAGMA page_count").fetchone()[0]
+        random.seed(1)
+        offsets = [
+            (random.randrange(max(args.contents - 10, 1)),) for _ in range(args.queries)
+        ]
+        results[layout] = {
+            "seed_s": round(seed_seconds, 3),
+            "file_mb": round(page_size * page_count / 2**20, 2),
+            "sizes_mb": sizes(connection),
+            "latest_page": timed(connection, LATEST_PAGE, offsets),
+            "full_join": timed(connection, FULL_JOIN, [()] * 5),
+        }
+        connection.close()
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "config": {"contents": args.contents, "queries": args.queries},
+        "results": results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
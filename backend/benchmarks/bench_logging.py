@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from common import percentile, setup_environment
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Log the records of a generation as JSON to a file, "
+        "formatted on the calling thread and through the logging queue, and "
+        "report the time the calling thread spends per request as JSON."
+    )
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument(
+        "--sample-rate",
+        type=float,
+        default=0.1,
+        help="share of payload-heavy records written",
+    )
+    parser.add_argument("--output", help="write the JSON report here")
+    return parser.parse_args()
+
+
+def measure(log_request, num_requests: int) -> dict:
+    latencies = []
+    for i in range(num_requests):
+        started_at = time.perf_counter()
+        log_request(i)
+        latencies.append(time.perf_counter() - started_at)
+    latencies.sort()
+    return {
+        "requests": num_requests,
+        "latency_us": {
+            "mean": round(sum(latencies) / len(latencies) * 1e6, 2),
+            "p50": round(percentile(latencies, 50) * 1e6, 2),
+            "p95": round(percentile(latencies, 95) * 1e6, 2),
+            "p99": round(percentile(latencies, 99) * 1e6, 2),
+        },
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    setup_environment()
+    from core.config import set_secret_provider
+    from core.logging import (
+        SAMPLED,
+        _json_formatter,
+        configure_logging,
+        get_logging_stats,
+        stop_logging,
+    )
+    from core.secrets import StaticSecretProvider
+    from models.requests.iikae_request import IikaeRequest
+
+    # JSON, as in prod
+    set_secret_provider(
+        StaticSecretProvider(
+            {"ENV_NAME": "prod", "LOG_PAYLOAD_SAMPLE_RATE": str(args.sample_rate)}
+        )
+    )
+
+    iikae_request = IikaeRequest(
+        who="上司",
+        what="締め切りを延ばしてほしい",
+        detail="来週の会議の資料が間に合わない",
+    )
+    paraphrases = [f"言い換え{i}" * 20 for i in range(3)]
+    stdout = sys.stdout
+    results = {}
+
+    # what the generation path did before: f-strings formatted and written on
+    # the calling thread
+    with tempfile.TemporaryFile("w") as f:
+        logger = logging.getLogger("benchmark.sync")
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        handler = logging.StreamHandler(f)
+        handler.setFormatter(_json_formatter())
+        logger.addHandler(handler)
+
+        def log_sync(index: int) -> None:
+            logger.info(f"iikae_request: {iikae_request}")
+            logger.info(f"generated_texts: {paraphrases}")
+            logger.info("Successfully generated response")
+
+        results["sync"] = measure(log_sync, args.requests)
+
+    with tempfile.TemporaryFile("w") as f:
+        sys.stdout = f
+        logger = configure_logging()
+        sys.stdout = stdout
+
+        def log_queued(index: int) -> None:
+            logger.info("iikae_request: %s", iikae_request, extra=SAMPLED)
+            logger.info("generated_texts: %s", paraphrases, extra=SAMPLED)
+            logger.info("Successfully generated response")
+
+        result = measure(log_queued, args.requests)
+        started_at = time.perf_counter()
+        stop_logging()
+        results["queued"] = dict(
+            result,
+            drain_s=round(time.perf_counter() - started_at, 3),
+            **get_logging_stats(),
+        )
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {"requests": args.requests, "sample_rate": args.sample_rate},
+        "results": results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+from common import percentile, setup_environment
+
+WORDS = (
+    "上司 部下 先輩 後輩 同僚 友達 彼女 彼氏 母 父 先生 客 店員 隣人 大家 "
+    "締め切り 会議 残業 休み 飲み会 旅行 給料 報告 資料 連絡 遅刻 掃除 料理 "
+    "お金 約束 返事 電話 メール 予定 仕事 宿題 試験 引っ越し 結婚式 誕生日 "
+    "延ばして 断りたい 伝えたい 謝りたい 頼みたい 返してほしい 手伝ってほしい "
+    "やめてほしい 来てほしい 教えてほしい 待ってほしい 早く 丁寧に やんわり "
+    "ちゃんと 明日 来週 今日 いつも また 少し とても 本当に 正直に "
+    "ありがとう ごめんなさい お願いします 申し訳ない 恐縮ですが 差し支えなければ "
+    "ランチ カフェ コーヒー ゲーム 映画 音楽 スマホ パソコン 車 自転車 電車"
+).split()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Build the search index over generated Japanese contents "
+        "and report the build time, its memory and query latency as JSON."
+    )
+    parser.add_argument("--contents", type=int, default=300000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--per-page", type=int, default=10)
+    parser.add_argument("--output", help="write the JSON report here")
+    return parser.parse_args()
+
+
+def sentence(num_words: int) -> str:
+    return "".join(random.choice(WORDS) for _ in range(num_words))
+
+
+def generate(num_contents: int) -> list[tuple[str, list[str]]]:
+    import ulid
+
+    return [
+        (
+            ulid.new().str.lower(),
+            [random.choice(WORDS), sentence(4), sentence(10)]
+            + [sentence(12) for _ in range(3)],
+        )
+        for _ in range(num_contents)
+    ]
+
+
+def main() -> None:
+    args = parse_args()
+    setup_environment()
+    from services.search_index import SearchIndex, _Postings
+
+    random.seed(0)
+    contents = generate(args.contents)
+
+    started_at = time.perf_counter()
+    postings = _Postings()
+    postings.add_many(contents)
+    build_seconds = time.perf_counter() - started_at
+    # the posting arrays with their allocated buffers and the term keys
+    memory_bytes = sum(
+        sys.getsizeof(term) + sys.getsizeof(posting)
+        for term, posting in postings.terms.items()
+    )
+
+    index = SearchIndex()
+    index._data = postings
+    queries = {
+        "one word": lambda: random.choice(WORDS),
+        "two words": lambda: f"{random.choice(WORDS)} {random.choice(WORDS)}",
+        "phrase": lambda: random.choice(WORDS) + random.choice(WORDS),
+        "one character": lambda: random.choice(random.choice(WORDS)),
+    }
+    results = {}
+    for name, make_query in queries.items():
+        latencies = []
+        totals = []
+        for _ in range(args.queries):
+            query = make_query()
+            started_at = time.perf_counter()
+            _, total = index.search(query, 0, args.per_page)
+            latencies.append(time.perf_counter() - started_at)
+            totals.append(total)
+        latencies.sort()
+        results[name] = {
+            "queries": len(latencies),
+            "mean_matches": round(sum(totals) / len(totals)) if totals else 0,
+            "latency_ms": {
+                "p50": round(percentile(latencies, 50) * 1000, 3),
+                "p95": round(percentile(latencies, 95) * 1000, 3),
+                "p99": round(percentile(latencies, 99) * 1000, 3),
+                "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+            },
+        }
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {"contents": args.contents, "queries": args.queries},
+        "index": {
+            "build_s": round(build_seconds, 3),
+            "postings_mb": round(memory_bytes / 2**20, 1),
+            **index.stats(),
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import time
+
+STARTED_AT = time.perf_counter()
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import json  # noqa: E402
+import os  # noqa: E402
+import platform  # noqa: E402
+import statistics  # noqa: E402
+import subprocess  # noqa: E402
+import sys  # noqa: E402
+from datetime import datetime, timezone  # noqa: E402
+
+from common import BENCHMARK_ENV, create_tables, setup_environment  # noqa: E402
+
+
+class SlowSecretProvider:
+    # stands in for Secret Manager with a fixed latency per fetch
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+
+    def fetch(self) -> dict[str, str]:
+        time.sleep(self.latency)
+        return dict(BENCHMARK_ENV, ENV_NAME="benchmark")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Start the API in fresh interpreters and report the time to "
+        "import it, to finish startup and to answer the first request."
+    )
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--secret-latency",
+        type=float,
+        default=0.5,
+        help="seconds per secret fetch",
+    )
+    parser.add_argument("--database", help="SQLite file to use (default: temp)")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+async def measure_child(args: argparse.Namespace) -> dict[str, float]:
+    import httpx
+
+    from core.config import set_secret_provider
+
+    set_secret_provider(SlowSecretProvider(args.secret_latency))
+    from main import app
+
+    imported_at = time.perf_counter()
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark"
+    ) as client:
+        started_at = time.perf_counter()
+        response = await client.get("/contents/")
+        response.raise_for_status()
+        first_response_at = time.perf_counter()
+
+    return {
+        "import_s": imported_at - STARTED_AT,
+        "startup_s": started_at - imported_at,
+        "first_request_s": first_response_at - started_at,
+        "time_to_first_response_s": first_response_at - STARTED_AT,
+    }
+
+
+def run_child(args: argparse.Namespace) -> None:
+    os.environ["ENV_NAME"] = "benchmark"
+    setup_environment(args.database)
+    result = asyncio.run(measure_child(args))
+    sys.stdout.write(json.dumps(result) + "\n")
+
+
+def main() -> None:
+    args = parse_args()
+    if args.child:
+        run_child(args)
+        return
+
+    database = setup_environment(args.database)
+    asyncio.run(create_tables())
+
+    runs: list[dict[str, float]] = []
+    for _ in range(args.runs):
+        started_at = time.perf_counter()
+        output = subprocess.run(
+            [
+                sys.executable,
+                __file__,
+                "--child",
+                "--database",
+                database,
+                "--secret-latency",
+                str(args.secret_latency),
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        result = json.loads(output.splitlines()[-1])
+        result["process_s"] = time.perf_counter() - started_at
+        runs.append(result)
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {"runs": args.runs, "secret_latency_s": args.secret_latency},
+        "results": {
+            key: {
+                "median_ms": round(statistics.median(r[key] for r in runs) * 1000, 3),
+                "max_ms": round(max(r[key] for r in runs) * 1000, 3),
+            }
+            for key in runs[0]
+        },
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable
+
+SRC_DIR = Path(__file__).resolve().parents[1] / "src"
+
+BENCHMARK_ENV = {
+    "ENV_NAME": "local",
+    "DB_NAME": "iikaesankai",
+    "DB_PASSWORD": "benchmark",
+    "DB_PORT": "3306",
+    "DB_USERNAME": "benchmark",
+    "OPENAI_API_KEY": "sk-benchmark",
+    "FRONTEND_URL": "http://localhost:3000",
+    "IS_TEST": "false",
+    # every request comes from the same client
+    "CLIENT_GENERATION_RATE": "1000000",
+    "CLIENT_GENERATION_BURST": "1000000",
+}
+
+
+def setup_environment(database_path: str | None = None) -> str:
+    # must run before anything from src is imported, since the settings and
+    # the engine are created from the environment
+    if database_path is None:
+        database_path = os.path.join(tempfile.mkdtemp(), "benchmark.db")
+    os.environ.update(BENCHMARK_ENV)
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{database_path}"
+    if str(SRC_DIR) not in sys.path:
+        sys.path.insert(0, str(SRC_DIR))
+    return database_path
+
+
+async def create_tables() -> None:
+    from sqlmodel import SQLModel
+
+    import models.sqlmodels  # noqa: F401
+    from core.db_settings import get_engine
+
+    async with get_engine().begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+
+class FakeCompletions:
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.calls = 0
+
+    async def create(self, stream: bool = False, **kwargs: Any) -> Any:
+        self.calls += 1
+        message = json.dumps(
+            {"paraphrases": [f"言い換え{self.calls}-{i}" for i in range(1, 4)]},
+            ensure_ascii=False,
+        )
+        if stream:
+            return self._stream(message)
+
+        await asyncio.sleep(self.latency)
+        return _completion(SimpleNamespace(content=message))
+
+    async def _stream(self, message: str):
+        chunks = [message[i : i + 8] for i in range(0, len(message), 8)]
+        for chunk in chunks:
+            await asyncio.sleep(self.latency / len(chunks))
+            yield _completion(SimpleNamespace(content=chunk))
+
+
+def _completion(message: SimpleNamespace) -> SimpleNamespace:
+    return SimpleNamespace(choices=[SimpleNamespace(message=message, delta=message)])
+
+
+class FakeOpenAI:
+    # stands in for AsyncOpenAI with a fixed latency per completion
+    def __init__(self, latency: float) -> None:
+        self.completions = FakeCompletions(latency)
+        self.chat = SimpleNamespace(completions=self.completions)
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    concurrency: int
+    duration: float = 0.0
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+
+    def summary(self) -> dict[str, Any]:
+        latencies = sorted(self.latencies)
+        requests = len(latencies) + self.errors
+        return {
+            "requests": requests,
+            "errors": self.errors,
+            "concurrency": self.concurrency,
+            "duration_s": round(self.duration, 4),
+            "throughput_rps": (
+                round(requests / self.duration, 2) if self.duration else 0.0
+            ),
+            "latency_ms": {
+                "mean": _ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+                "p50": _ms(percentile(latencies, 50)),
+                "p95": _ms(percentile(latencies, 95)),
+                "p99": _ms(percentile(latencies, 99)),
+                "max": _ms(latencies[-1]) if latencies else 0.0,
+            },
+        }
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(q / 100 * len(sorted_values)) - 1
+    return sorted_values[max(rank, 0)]
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+async def run_load(
+    name: str,
+    num_requests: int,
+    concurrency: int,
+    send: Callable[[int], Awaitable[bool]],
+) -> BenchmarkResult:
+    result = BenchmarkResult(name=name, concurrency=concurrency)
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal next_index
+        while next_index < num_requests:
+            index = next_index
+            next_index += 1
+            started_at = time.perf_counter()
+            try:
+                ok = await send(index)
+            except Exception:
+                ok = False
+            if ok:
+                result.latencies.append(time.perf_counter() - started_at)
+            else:
+                result.errors += 1
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.duration = time.perf_counter() - started_at
+    return result
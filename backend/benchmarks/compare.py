@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Compare two bench_endpoints.py reports and flag regressions."
+    )
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative change that counts as a regression (default: 0.1)",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    with open(args.candidate) as f:
+        candidate = json.load(f)["results"]
+
+    regressions = []
+    for name, before in baseline.items():
+        after = candidate.get(name)
+        if after is None:
+            continue
+
+        changes = {
+            "throughput_rps": _change(
+                before["throughput_rps"], after["throughput_rps"]
+            ),
+            "p99_ms": _change(before["latency_ms"]["p99"], after["latency_ms"]["p99"]),
+        }
+        regressed = (
+            changes["throughput_rps"] < -args.threshold
+            or changes["p99_ms"] > args.threshold
+        )
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{'REGRESSION' if regressed else 'ok':<10} {name:<40} "
+            f"throughput {changes['throughput_rps']:+.1%} "
+            f"p99 {changes['p99_ms']:+.1%}"
+        )
+
+    sys.exit(1 if regressions else 0)
+
+
+def _change(before: float, after: float) -> float:
+    if not before:
+        return 0.0
+    return (after - before) / before
+
+
+if __name__ == "__main__":
+    main()
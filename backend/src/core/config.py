@@ -1,35 +1,22 @@
 from __future__ import annotations
 
-import json
 import os
+import threading
+from typing import Optional, cast
 
 from dotenv import load_dotenv
-from google.cloud import secretmanager
 from pydantic import SecretStr
 from pydantic_settings import BaseSettings
 
 from core.constants import PROJECT_NAME
+from core.secrets import GoogleSecretManagerProvider, SecretCache, SecretProvider
 
-
-if os.environ.get("ENV_NAME") == "local":
-    local_env_file_path = os.path.abspath(
-        os.path.join(
-            os.path.dirname(__file__),
-            "../.env",
-        )
-    )
-    load_dotenv(dotenv_path=local_env_file_path)
-
-else:
-    client = secretmanager.SecretManagerServiceClient()
-    secret_name = f"projects/{PROJECT_NAME}/secrets/{PROJECT_NAME}/versions/latest"
-
-    response = client.access_secret_version(name=secret_name)
-    payload_data = response.payload.data.decode("UTF-8")
-    secret_dict = json.loads(payload_data)
-
-    for key, value in secret_dict.items():
-        os.environ[key] = value
+# these configure how the other settings are loaded, so they are plain
+# environment variables
+SECRET_CACHE_TTL = float(os.environ.get("SECRET_CACHE_TTL", 3600))
+# the secrets are only written to disk when a path is given; otherwise they are
+# kept in memory
+SECRET_CACHE_PATH = os.environ.get("SECRET_CACHE_PATH") or None
 
 
 class Settings(BaseSettings):
@@ -39,7 +26,68 @@ class Settings(BaseSettings):
     db_password: SecretStr
     db_port: str
     db_username: str
+    database_url: str = ""
     openai_api_key: SecretStr
+    # seconds a call waits for the response, or a stream for its next chunk.
+    # Calls are not retried on timeouts, but POST /iikae/ makes up to three
+    # calls when completions come back short, so it can take three times this
+    # after waiting for a generation slot
+    openai_timeout: float = 60.0
+    # the adaptive concurrency limit starts at the maximum
+    min_concurrent_generations: int = 2
+    max_concurrent_generations: int = 16
+    generation_latency_target: float = 20.0
+    generation_queue_size: int = 16
+    generation_queue_timeout: float = 2.0
+    client_generation_rate: float = 0.2
+    client_generation_burst: int = 5
+    client_bucket_cache_size: int = 10000
+    # the number of proxies in front of the api that append to X-Forwarded-For,
+    # e.g. 1 on Cloud Run; 0 takes the address of the connection instead
+    trusted_proxy_depth: int = 1
+    generation_cache_size: int = 1024
+    generation_cache_ttl: float = 600.0
+    vote_flush_interval: float = 1.0
+    vote_flush_threshold: int = 1000
+    # a client's vote for a paraphrase is counted once per VOTE_DEDUPE_WINDOW
+    # seconds (up to twice that); VOTE_DEDUPE_CAPACITY votes per window are kept
+    # at VOTE_DEDUPE_ERROR_RATE false positives, a window is cut short past that.
+    # Clients are told apart by address only, so everyone behind one NAT counts
+    # as one client; the window is short enough to only catch double taps and
+    # bursts, and the frontend keeps a browser from voting twice
+    vote_dedupe_window: float = 60.0
+    vote_dedupe_capacity: int = 100000
+    vote_dedupe_error_rate: float = 0.001
+    page_cache_size: int = 256
+    latest_page_cache_ttl: float = 30.0
+    ranking_page_cache_ttl: float = 5.0
+    ranking_rebuild_interval: float = 300.0
+    max_batch_contents: int = 100
+    content_fragment_cache_size: int = 4096
+    generation_workers: int = 4
+    max_queued_generation_jobs: int = 100
+    generation_job_poll_interval: float = 1.0
+    # running jobs older than this are requeued; a worker gives up on a job
+    # after half of it
+    generation_job_timeout: float = 300.0
+    generation_job_max_attempts: int = 3
+    search_rebuild_interval: float = 3600.0
+    max_search_query_length: int = 100
+    # requests at least this similar to a past one to the same "who" get its
+    # paraphrases instead of a new generation, e.g. 0.9; above 1 disables it
+    similarity_threshold: float = 1.1
+    similarity_dimensions: int = 256
+    similarity_rebuild_interval: float = 3600.0
+    # every ARCHIVE_INTERVAL seconds, contents older than ARCHIVE_AFTER_DAYS with
+    # at most ARCHIVE_MAX_VOTE_COUNT votes, and soft-deleted ones, are moved to
+    # the archive tables and leave the listings; off unless an interval is set
+    archive_interval: float = 0.0
+    archive_after_days: float = 180.0
+    archive_max_vote_count: int = 5
+    archive_batch_size: int = 500
+    archive_batch_pause: float = 0.5
+    # the share of payload-heavy log records, like generated texts, written
+    log_payload_sample_rate: float = 0.1
     instance_connection_name: str = ""
     frontend_url: str
     is_test: bool = False
@@ -48,4 +96,62 @@ class Settings(BaseSettings):
         case_sensitive = False
 
 
-settings = Settings()
+_settings: Optional[Settings] = None
+_secret_cache: Optional[SecretCache] = None
+# settings may be loaded from a worker thread at startup and from the event
+# loop at the same time
+_settings_lock = threading.Lock()
+
+
+def set_secret_provider(
+    provider: SecretProvider, cache_path: Optional[str] = None
+) -> None:
+    # replaces Secret Manager, e.g. with a StaticSecretProvider in tests; the
+    # settings are loaded again on next access
+    global _settings, _secret_cache
+    _secret_cache = SecretCache(provider, SECRET_CACHE_TTL, cache_path)
+    _settings = None
+
+
+def _load_environment() -> None:
+    global _secret_cache
+    if _secret_cache is None:
+        if os.environ.get("ENV_NAME") == "local":
+            local_env_file_path = os.path.abspath(
+                os.path.join(
+                    os.path.dirname(__file__),
+                    "../.env",
+                )
+            )
+            load_dotenv(dotenv_path=local_env_file_path)
+            return
+
+        secret_name = f"projects/{PROJECT_NAME}/secrets/{PROJECT_NAME}/versions/latest"
+        _secret_cache = SecretCache(
+            GoogleSecretManagerProvider(secret_name),
+            SECRET_CACHE_TTL,
+            SECRET_CACHE_PATH,
+        )
+
+    for key, value in _secret_cache.get().items():
+        os.environ[key] = value
+
+
+def get_settings() -> Settings:
+    global _settings
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                _load_environment()
+                _settings = Settings()
+    return _settings
+
+
+class _LazySettings:
+    # loads the settings, and the secrets they need, on first attribute access
+    # instead of at import
+    def __getattr__(self, name: str):
+        return getattr(get_settings(), name)
+
+
+settings = cast(Settings, _LazySettings())
@@ -7,6 +7,14 @@ from models.responses.post_iikae_response import PostIikaeResponse
 class OrderBy(str, Enum):
     latest = "latest"
     ranking = "ranking"
+    hot = "hot"
+
+
+class JobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
 
 
 AI_MODEL = "gpt-4-turbo-preview"
@@ -16,6 +24,16 @@ PROJECT_NAME = "iikaesankai"
 
 NUM_PARAPHRASES_PER_CONTENT = 3
 
+# the largest page of contents, searched or listed
+MAX_PER_PAGE = 100
+
+# "hot" scores grow by 1 for every HOT_DECAY_SECONDS since HOT_EPOCH and by 1
+# for every 10x votes, so a newer content needs fewer votes to rank higher
+HOT_EPOCH = 1704067200  # 2024-01-01T00:00:00Z
+HOT_DECAY_SECONDS = 45000
+
+TEST_IIKAE_JOB_ID = "test_job_id"
+
 TEST_POST_IIKAE_RESPONSE = PostIikaeResponse(
     content=Content(
         content_id="test_content_id",
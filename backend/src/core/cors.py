@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from typing import Any, Callable
+
+from starlette.middleware.cors import CORSMiddleware
+
+
+class LazyCORSMiddleware:
+    # builds the CORSMiddleware on the first request, since the allowed origins
+    # come from the settings, which should not be loaded at startup
+    def __init__(self, app, allow_origins: Callable[[], list[str]], **options: Any):
+        self.app = app
+        self.allow_origins = allow_origins
+        self.options = options
+        self._middleware: CORSMiddleware | None = None
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self._middleware is None:
+            self._middleware = CORSMiddleware(
+                self.app, allow_origins=self.allow_origins(), **self.options
+            )
+        await self._middleware(scope, receive, send)
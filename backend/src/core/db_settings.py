@@ -1,24 +1,40 @@
-from contextlib import contextmanager
+from __future__ import annotations
 
-from sqlalchemy import create_engine, engine
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from sqlalchemy import engine
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import scoped_session, sessionmaker
 
 from core.config import settings
+from core.metrics import instrument_engine
 
 Base = declarative_base()
 
-if settings.env_name == "local":
-    url = "mysql://%s:%s@%s:%s/%s?charset=utf8mb4" % (
-        settings.db_username,
-        settings.db_password.get_secret_value(),
-        settings.db_host,
-        settings.db_port,
-        settings.db_name,
-    )
-else:
-    url = engine.url.URL.create(
-        drivername="mysql",
+_engine: Optional[AsyncEngine] = None
+_sessionmaker: Optional[async_sessionmaker[AsyncSession]] = None
+
+
+def _database_url() -> str | engine.URL:
+    if settings.database_url:
+        # e.g. sqlite+aiosqlite:///./iikaesankai.db for running locally without MySQL
+        return settings.database_url
+    if settings.env_name == "local":
+        return "mysql+aiomysql://%s:%s@%s:%s/%s?charset=utf8mb4" % (
+            settings.db_username,
+            settings.db_password.get_secret_value(),
+            settings.db_host,
+            settings.db_port,
+            settings.db_name,
+        )
+    return engine.url.URL.create(
+        drivername="mysql+aiomysql",
         username=settings.db_username,
         password=settings.db_password.get_secret_value(),
         database=settings.db_name,
@@ -29,24 +45,36 @@ else:
     )
 
 
-db_engine = create_engine(url, pool_pre_ping=True)
+def get_engine() -> AsyncEngine:
+    # created on first use so that importing does not load the settings
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(_database_url(), pool_pre_ping=True)
+        instrument_engine(_engine.sync_engine)
+    return _engine
 
-Session = sessionmaker(autocommit=False, autoflush=False, bind=db_engine)
-ScopedSession = scoped_session(Session)
 
+def _get_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    global _sessionmaker
+    if _sessionmaker is None:
+        # objects stay usable after commit instead of being lazily refreshed,
+        # which is not possible with an AsyncSession
+        _sessionmaker = async_sessionmaker(
+            bind=get_engine(), autoflush=False, expire_on_commit=False
+        )
+    return _sessionmaker
 
-@contextmanager
-def get_db_session():
-    session = ScopedSession()
-    try:
-        yield session
-    except Exception as e:
-        session.rollback()
-        raise e
-    finally:
-        session.close()
+
+@asynccontextmanager
+async def get_db_session():
+    async with _get_sessionmaker()() as session:
+        try:
+            yield session
+        except Exception as e:
+            await session.rollback()
+            raise e
 
 
-def get_db_session_for_depends():
-    with get_db_session() as session:
+async def get_db_session_for_depends():
+    async with get_db_session() as session:
         yield session
@@ -29,3 +29,17 @@ class ValidationError(HTTPException):
         self, detail: Any = None, headers: Optional[Dict[str, Any]] = None
     ) -> None:
         super().__init__(status.HTTP_422_UNPROCESSABLE_ENTITY, detail, headers)
+
+
+class ServiceUnavailableError(HTTPException):
+    def __init__(
+        self, detail: Any = None, headers: Optional[Dict[str, Any]] = None
+    ) -> None:
+        super().__init__(status.HTTP_503_SERVICE_UNAVAILABLE, detail, headers)
+
+
+class TooManyRequestsError(HTTPException):
+    def __init__(
+        self, detail: Any = None, headers: Optional[Dict[str, Any]] = None
+    ) -> None:
+        super().__init__(status.HTTP_429_TOO_MANY_REQUESTS, detail, headers)
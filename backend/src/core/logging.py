@@ -1,10 +1,24 @@
+import atexit
 import json
 import logging
+import queue
+import random
 import sys
 import traceback
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Optional
 
 from core.config import settings
 
+LOG_QUEUE_SIZE = 10000
+
+# pass as extra to log payload-heavy records at LOG_PAYLOAD_SAMPLE_RATE only
+SAMPLED = {"sampled": True}
+
+_listener: Optional[QueueListener] = None
+dropped = 0
+sampled_out = 0
+
 
 class FormatterJSON(logging.Formatter):
     def format(self, record):
@@ -26,33 +40,111 @@ class FormatterJSON(logging.Formatter):
             "event": record.__dict__.get("event", {}),
         }
         if record.exc_info:
-            j["traceback"] = traceback.format_exc().splitlines()
+            # formatted on the listener's thread, where the exception is no
+            # longer being handled
+            j["traceback"] = "".join(
+                traceback.format_exception(*record.exc_info)
+            ).splitlines()
+
+        return json.dumps(j, ensure_ascii=False, default=str)
+
+
+class _EnvironmentFormatter(logging.Formatter):
+    # JSON in prod and dev, uvicorn's format otherwise; decided on the first
+    # record, as the settings are not loaded yet when logging is configured
+    def __init__(self) -> None:
+        super().__init__()
+        self._formatter: Optional[logging.Formatter] = None
+
+    def format(self, record):
+        if self._formatter is None:
+            try:
+                env_name = settings.env_name
+            except Exception:
+                return _plain_formatter().format(record)
+            if env_name in ["prod", "dev"]:
+                self._formatter = _json_formatter()
+            else:
+                self._formatter = _plain_formatter()
+        return self._formatter.format(record)
+
+
+def _json_formatter() -> logging.Formatter:
+    return FormatterJSON(
+        "[%(levelname)s]\t%(asctime)s.%(msecs)dZ\t%(levelno)s\t%(message)s\n",
+        "%Y-%m-%dT%H:%M:%S",
+    )
+
+
+def _plain_formatter() -> logging.Formatter:
+    from uvicorn.logging import DefaultFormatter
 
-        return json.dumps(j, ensure_ascii=False)
+    return DefaultFormatter("%(levelprefix)s %(message)s")
+
+
+class _SamplingFilter(logging.Filter):
+    def filter(self, record):
+        global sampled_out
+        if not record.__dict__.get("sampled"):
+            return True
+        if random.random() < settings.log_payload_sample_rate:
+            return True
+        sampled_out += 1
+        return False
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record):
+        # the queue is in process, so the record is queued as is and the
+        # message is only formatted on the listener's thread
+        return record
+
+    def enqueue(self, record):
+        global dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped += 1
 
 
 def configure_logging():
+    # records are only queued by the thread that logs them; a listener thread
+    # formats and writes them
+    global _listener
     logger = logging.getLogger("uvicorn")
+    if _listener is not None:
+        return logger
     handler = logging.StreamHandler(sys.stdout)
     handler.setLevel(logging.DEBUG)
+    handler.setFormatter(_EnvironmentFormatter())
+    log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(_SamplingFilter())
+
     logger.setLevel(logging.DEBUG)
-    formatter = FormatterJSON(
-        "[%(levelname)s]\t%(asctime)s.%(msecs)dZ\t%(levelno)s\t%(message)s\n",
-        "%Y-%m-%dT%H:%M:%S",
-    )
-    # if settings.env_name in ["prod", "dev"]:
-    #     handler.setFormatter(formatter)
-    # if logger.hasHandlers():
-    #     logger.handlers.clear()
-    # logger.addHandler(handler)
-    # alchemy_logger = logging.getLogger("sqlalchemy")
-    # if alchemy_logger.hasHandlers():
-    #     alchemy_logger.handlers.clear()
-    # alchemy_logger.addHandler(handler)
-    # if settings.env_name in ["prod", "dev"]:
-    #     alchemy_logger.setLevel(logging.INFO)
-
-    # logger.propagate = False
-    # alchemy_logger.propagate = False
+    if logger.hasHandlers():
+        logger.handlers.clear()
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
 
     return logger
+
+
+def stop_logging() -> None:
+    # writes out the queued records
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logging_stats() -> dict[str, Any]:
+    return {
+        "queued": _listener.queue.qsize() if _listener is not None else 0,
+        "dropped": dropped,
+        "sampled_out": sampled_out,
+    }
@@ -0,0 +1,325 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import functools
+import math
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Callable, Iterable, Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+LLM_BUCKETS = (0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 20.0, 30.0, 60.0)
+
+BACKGROUND_ROUTE = "background"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # per label set: counts per bucket (the last one is +Inf), sum
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1][0] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else _number(bound)
+                bucket_labels = _labels(self.labelnames + ("le",), labels + (le,))
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            label_text = _labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_text} {_number(total[0])}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request",
+    ("method", "route", "status"),
+)
+llm_request_duration = Histogram(
+    "llm_request_duration_seconds",
+    "Time spent waiting for a single LLM completion",
+    ("route",),
+    buckets=LLM_BUCKETS,
+)
+llm_requests = Counter("llm_requests_total", "LLM completions requested", ("route",))
+llm_retries = Counter(
+    "llm_retries_total", "LLM completions retried because of bad output", ("route",)
+)
+llm_repairs = Counter(
+    "llm_repairs_total",
+    "LLM outputs used after repairing their format instead of retrying",
+    ("route",),
+)
+llm_calls_avoided = Counter(
+    "llm_calls_avoided_total",
+    "Generations answered with stored paraphrases instead of the LLM",
+    ("route", "reason"),
+)
+similarity_lookup_duration = Histogram(
+    "similarity_lookup_duration_seconds",
+    "Time spent looking up similar past requests",
+    ("route",),
+)
+db_duration = Histogram(
+    "db_duration_seconds",
+    "Time spent executing SQL statements per request",
+    ("route",),
+)
+db_statements = Counter("db_statements_total", "SQL statements executed", ("route",))
+serialization_duration = Histogram(
+    "serialization_duration_seconds",
+    "Time spent validating and serializing the response body",
+    ("route",),
+)
+
+_metrics: list[Any] = [
+    http_request_duration,
+    llm_request_duration,
+    llm_requests,
+    llm_retries,
+    llm_repairs,
+    llm_calls_avoided,
+    similarity_lookup_duration,
+    db_duration,
+    db_statements,
+    serialization_duration,
+]
+_stats_providers: dict[str, Callable[[], dict[str, Any]]] = {}
+
+
+class RequestTimings:
+    __slots__ = ("route", "db_seconds", "endpoint_finished_at", "serialize_seconds")
+
+    def __init__(self) -> None:
+        # replaced by the route path once the endpoint is called
+        self.route = "unmatched"
+        self.db_seconds = 0.0
+        self.endpoint_finished_at: Optional[float] = None
+        self.serialize_seconds: Optional[float] = None
+
+
+_current_timings: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "current_timings", default=None
+)
+
+
+def _current_route() -> str:
+    timings = _current_timings.get()
+    return timings.route if timings is not None else BACKGROUND_ROUTE
+
+
+def record_llm_call(seconds: float) -> None:
+    route = _current_route()
+    llm_requests.inc(route)
+    llm_request_duration.observe(seconds, route)
+
+
+def record_llm_retry() -> None:
+    llm_retries.inc(_current_route())
+
+
+def record_llm_repair() -> None:
+    llm_repairs.inc(_current_route())
+
+
+def record_llm_call_avoided(reason: str) -> None:
+    llm_calls_avoided.inc(_current_route(), reason)
+
+
+def record_similarity_lookup(seconds: float) -> None:
+    similarity_lookup_duration.observe(seconds, _current_route())
+
+
+def register_stats(name: str, provider: Callable[[], dict[str, Any]]) -> None:
+    # numeric values of the provider are also exported as <name>_<key> gauges
+    _stats_providers[name] = provider
+
+
+def get_stats() -> dict[str, dict[str, Any]]:
+    return {name: provider() for name, provider in _stats_providers.items()}
+
+
+def render_metrics() -> str:
+    lines: list[str] = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for name, stats in get_stats().items():
+        for key, value in _flatten(stats):
+            metric_name = f"{name}_{key}"
+            lines.append(f"# TYPE {metric_name} gauge")
+            lines.append(f"{metric_name} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _flatten(stats: dict[str, Any], prefix: str = "") -> Iterable[tuple[str, float]]:
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{key}_")
+        elif isinstance(value, (int, float)):
+            yield f"{prefix}{key}", value
+
+
+def instrument_engine(engine: Engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        context._query_started_at = perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = perf_counter() - context._query_started_at
+        timings = _current_timings.get()
+        if timings is None:
+            db_statements.inc(BACKGROUND_ROUTE)
+            return
+        timings.db_seconds += elapsed
+        db_statements.inc(timings.route)
+
+
+class MetricsMiddleware:
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        status_code = 500
+
+        async def send_wrapper(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started_at = perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_timings.reset(token)
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            http_request_duration.observe(
+                perf_counter() - started_at,
+                scope["method"],
+                route_path,
+                str(status_code),
+            )
+            if route is not None:
+                db_duration.observe(timings.db_seconds, route_path)
+                if timings.serialize_seconds is not None:
+                    serialization_duration.observe(
+                        timings.serialize_seconds, route_path
+                    )
+
+
+class InstrumentedRoute(APIRoute):
+    def get_route_handler(self) -> Callable:
+        endpoint = self.dependant.call
+        if asyncio.iscoroutinefunction(endpoint):
+
+            @functools.wraps(endpoint)
+            async def timed_endpoint(*args, **kwargs):
+                timings = _current_timings.get()
+                if timings is not None:
+                    timings.route = self.path
+                try:
+                    return await endpoint(*args, **kwargs)
+                finally:
+                    if timings is not None:
+                        timings.endpoint_finished_at = perf_counter()
+
+            self.dependant.call = timed_endpoint
+
+        handler = super().get_route_handler()
+
+        async def instrumented_handler(request):
+            response = await handler(request)
+            # everything between the endpoint returning and the response being
+            # built is response validation and serialization
+            timings = _current_timings.get()
+            if timings is not None and timings.endpoint_finished_at is not None:
+                timings.serialize_seconds = (
+                    perf_counter() - timings.endpoint_finished_at
+                )
+            return response
+
+        return instrumented_handler
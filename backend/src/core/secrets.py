@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from typing import Optional, Protocol
+
+logger = logging.getLogger("uvicorn")
+
+
+class SecretProvider(Protocol):
+    def fetch(self) -> dict[str, str]: ...
+
+
+class GoogleSecretManagerProvider:
+    def __init__(self, secret_name: str, timeout: float = 10.0) -> None:
+        self.secret_name = secret_name
+        self.timeout = timeout
+        self._client = None
+
+    def fetch(self) -> dict[str, str]:
+        # imported here since google.cloud is slow to import and is not needed
+        # locally or in tests
+        from google.cloud import secretmanager
+
+        if self._client is None:
+            self._client = secretmanager.SecretManagerServiceClient()
+        response = self._client.access_secret_version(
+            name=self.secret_name, timeout=self.timeout
+        )
+        return json.loads(response.payload.data.decode("UTF-8"))
+
+
+class StaticSecretProvider:
+    # local stand-in, e.g. for tests and benchmarks
+    def __init__(self, secrets: dict[str, str]) -> None:
+        self.secrets = secrets
+
+    def fetch(self) -> dict[str, str]:
+        return dict(self.secrets)
+
+
+class SecretCache:
+    def __init__(
+        self, provider: SecretProvider, ttl: float, path: Optional[str] = None
+    ) -> None:
+        # secrets are also written to path, if given, so that a restarted
+        # container can reuse them for ttl seconds and can fall back to them
+        # when the provider is unreachable
+        self.provider = provider
+        self.ttl = ttl
+        self.path = path
+        self.fetches = 0
+        self.stale_reads = 0
+        self._secrets: Optional[dict[str, str]] = None
+        self._fetched_at = 0.0
+
+    def get(self) -> dict[str, str]:
+        if self._secrets is None:
+            self._read_file()
+        if self._secrets is not None and time.time() - self._fetched_at < self.ttl:
+            return self._secrets
+
+        try:
+            secrets = self.provider.fetch()
+        except Exception:
+            if self._secrets is None:
+                raise
+            logger.exception("Failed to fetch secrets, using the cached ones")
+            self.stale_reads += 1
+            return self._secrets
+
+        self.fetches += 1
+        self._secrets = secrets
+        self._fetched_at = time.time()
+        self._write_file()
+        return secrets
+
+    def _read_file(self) -> None:
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                self._secrets = json.load(f)
+            self._fetched_at = os.path.getmtime(self.path)
+        except (OSError, ValueError):
+            logger.warning("Ignoring the unreadable secret cache %s", self.path)
+
+    def _write_file(self) -> None:
+        if self.path is None:
+            return
+        try:
+            fd = os.open(
+                f"{self.path}.tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600
+            )
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._secrets, f)
+            os.replace(f"{self.path}.tmp", self.path)
+        except OSError:
+            logger.warning("Failed to write the secret cache %s", self.path)
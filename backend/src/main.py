@@ -1,45 +1,152 @@
 from __future__ import annotations
 
-from fastapi import BackgroundTasks, Depends, FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from openai import OpenAI
-from sqlalchemy.orm import Session
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime
 
-from core.config import settings
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import get_settings, settings
 from core.constants import (
-    AI_MODEL,
-    NUM_PARAPHRASES_PER_CONTENT,
-    TEMPERATURE,
+    MAX_PER_PAGE,
+    TEST_IIKAE_JOB_ID,
     TEST_POST_IIKAE_RESPONSE,
+    JobStatus,
+    OrderBy,
+)
+from core.cors import LazyCORSMiddleware
+from core.db_settings import get_db_session, get_db_session_for_depends, get_engine
+from core.exceptions import NotFoundError, ValidationError
+from core.logging import configure_logging, get_logging_stats
+from core.metrics import (
+    InstrumentedRoute,
+    MetricsMiddleware,
+    get_stats,
+    record_llm_call_avoided,
+    register_stats,
+    render_metrics,
 )
-from core.db_settings import get_db_session_for_depends
-from core.logging import configure_logging
 from models.custom_types.content import Content
 from models.custom_types.pagination import Pagination
 from models.requests.iikae_request import IikaeRequest
 from models.requests.vote_request import VoteRequest
+from models.responses.get_contents_batch_response import GetContentsBatchResponse
 from models.responses.get_contents_response import GetContentsResponse
+from models.responses.get_iikae_job_response import GetIikaeJobResponse
+from models.responses.post_iikae_job_response import PostIikaeJobResponse
 from models.responses.post_iikae_response import PostIikaeResponse
-from models.sqlmodels.paraphrase import Paraphrase
-from repositories.content import get_content_by_id, get_contents_by_order
-from repositories.input import create_input
-from repositories.paraphrase import add_vote_count, create_paraphrase
-
-app = FastAPI()
-
-client = OpenAI(api_key=settings.openai_api_key.get_secret_value())
+from models.responses.search_contents_response import SearchContentsResponse
+from models.sqlmodels.generation_job import GenerationJob
+from repositories.content import (
+    create_content,
+    get_content_by_id,
+    get_contents_by_ids,
+    get_contents_by_order,
+)
+from repositories.generation_job import get_generation_job
+from services.admission import client_key, client_rate_limiter, get_admission_stats
+from services.archiver import content_archiver
+from services.content_encoder import (
+    encode_content,
+    encode_contents_batch_response,
+    encode_contents_response,
+    encode_search_response,
+    get_fragment_cache_stats,
+)
+from services.generation import (
+    generate_paraphrases,
+    get_generation_stats,
+    stream_paraphrases,
+    validate_iikae_request,
+)
+from services.generation_cache import (
+    cache_content,
+    fingerprint_request,
+    get_cached_content,
+    get_generation_cache_stats,
+)
+from services.job_queue import generation_job_queue
+from services.page_cache import (
+    apply_vote_counts,
+    cache_page,
+    get_cached_page,
+    get_page_cache_stats,
+    invalidate_latest_pages,
+)
+from services.ranking_index import get_ranked_contents, ranking_index
+from services.search_index import search_contents, search_index
+from services.similarity_index import find_similar_content, similarity_index
+from services.vote_buffer import vote_buffer
+from services.vote_dedupe import vote_deduplicator
+
+
+async def warm_up() -> None:
+    # loads the settings and builds the in-memory indexes in the background so
+    # that startup does not wait on Secret Manager or the database; whatever
+    # fails here is retried on first use
+    try:
+        await asyncio.to_thread(get_settings)
+        get_engine()
+        await ranking_index.ensure_ready()
+        await search_index.ensure_ready()
+        await similarity_index.ensure_ready()
+    except Exception:
+        logger.exception("Failed to warm up")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    vote_buffer.start()
+    ranking_index.start()
+    search_index.start()
+    similarity_index.start()
+    generation_job_queue.start()
+    content_archiver.start()
+    warm_up_task = asyncio.create_task(warm_up())
+    yield
+    warm_up_task.cancel()
+    await content_archiver.stop()
+    await generation_job_queue.stop()
+    await similarity_index.stop()
+    await search_index.stop()
+    await ranking_index.stop()
+    await vote_buffer.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+app.router.route_class = InstrumentedRoute
 
 logger = configure_logging()
 
+vote_buffer.add_listener(apply_vote_counts)
+vote_buffer.add_listener(ranking_index.apply_vote_counts)
+
+register_stats("generation", get_generation_stats)
+register_stats("generation_cache", get_generation_cache_stats)
+register_stats("generation_jobs", generation_job_queue.stats)
+register_stats("admission", get_admission_stats)
+register_stats("vote_buffer", vote_buffer.stats)
+register_stats("vote_dedupe", vote_deduplicator.stats)
+register_stats("page_cache", get_page_cache_stats)
+register_stats("ranking_index", ranking_index.stats)
+register_stats("search_index", search_index.stats)
+register_stats("similarity_index", similarity_index.stats)
+register_stats("content_fragments", get_fragment_cache_stats)
+register_stats("archive", content_archiver.stats)
+register_stats("logging", get_logging_stats)
+
 # Set up CORS
-origins = [settings.frontend_url]
 app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
+    LazyCORSMiddleware,
+    allow_origins=lambda: [settings.frontend_url],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 
 @app.get("/")
@@ -51,186 +158,315 @@ async def root():
 
 @app.post("/iikae/", response_model=PostIikaeResponse)
 async def post_iikae(
-    iikae_request: IikaeRequest, session: Session = Depends(get_db_session_for_depends)
+    iikae_request: IikaeRequest,
+    request: Request,
+    session: AsyncSession = Depends(get_db_session_for_depends),
 ):
     if settings.is_test:
-        import time
-
-        time.sleep(3)
+        await asyncio.sleep(3)
         return TEST_POST_IIKAE_RESPONSE
 
-    # limit the text length
-    if (
-        len(iikae_request.what) > 100
-        or len(iikae_request.who) > 100
-        or len(iikae_request.detail) > 200
-    ):
-        raise ValueError("Text length is too long")
-
-    text = f"""
-[言いたいこと]
-{iikae_request.what}
-
-[相手]
-{iikae_request.who}
-
-[詳しく]
-{iikae_request.detail}
-"""
-
-    system_message = """
-# 役割
-あなたは人々が抱える「言いにくいこと」を面白く言い換える天才です。
-
-# 指示
-ユーザが入力した「言いにくいこと」を、例え話などを盛り込み面白く言い換えてください。
-回答はアプローチを変えて3パターンで簡潔に、3つ目の回答は関西弁でお願いします。
-もしもユーザーの入力が[誰に] [言いたいこと] [詳しく] と関係ないものや公序良俗に反するものであったり、[詳しく] に正しい文章が書かれていないときは「無効な入力かい！」とだけ返答してください。
-
-# 例1
-ユーザー：
----
-[誰に]
-会社のお偉いさん
-
-[言いたいこと]
-カツラずれてますよ
-
-[詳しく]
-たまに会社のお偉いさんと一緒にゴルフに行くことがあるが、よくカツラがずれていて気まずい
----
-
-あなた：
----
-今日の風、なかなかのやんちゃ坊主ですね。お帽子の下の小鳥さんが巣立ちそうになってますよ。
-
-今のプレイは素晴らしかったですね。でも、どうやら頭上の草原が少し南に移動しているようです。風のせいかもしれませんね。
-
-社長さん、今日の頭ん上、ちょっとお出かけモードやないですか？カツラさんが、"今日はこっち行こか～"って、ちょっとお散歩してるみたいですわ。
----
-
-# 例2
-ユーザー：
----
-[誰に]
-友達
-
-[言いたいこと]
-おはよう
-
-[詳しく]
-あああ
----
-
-あなた：
----
-無効な入力かい！
----
-"""
-    MAX_RETRIES = 3
-    for i in range(MAX_RETRIES):
-        completion = client.chat.completions.create(
-            model=AI_MODEL,
-            temperature=TEMPERATURE,
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_message,
-                },
-                {
-                    "role": "user",
-                    "content": text,
-                },
-            ],
+    validate_iikae_request(iikae_request)
+
+    fingerprint = fingerprint_request(iikae_request)
+    cached_content = await get_stored_content(session, iikae_request, fingerprint)
+    if cached_content is not None:
+        return PostIikaeResponse(content=cached_content)
+
+    # only requests that reach the model count against the client
+    client_rate_limiter.admit(client_key(request))
+    # return the connection to the pool while waiting for the model, so that
+    # waiting requests do not hold up the ones that only read
+    await session.commit()
+    generated_texts = await generate_paraphrases(iikae_request)
+
+    content = await save_content(session, iikae_request, generated_texts, fingerprint)
+    return PostIikaeResponse(content=content)
+
+
+@app.post("/iikae/stream")
+async def post_iikae_stream(
+    iikae_request: IikaeRequest,
+    request: Request,
+    session: AsyncSession = Depends(get_db_session_for_depends),
+):
+    if settings.is_test:
+        await asyncio.sleep(3)
+        return StreamingResponse(
+            content_event_stream(TEST_POST_IIKAE_RESPONSE.content),
+            media_type="text/event-stream",
         )
 
-        generated_message = completion.choices[0].message.content
+    validate_iikae_request(iikae_request)
 
-        if "無効な入力かい！" in generated_message:
-            logger.info(f"Got invalid input: {iikae_request}")
-            raise HTTPException(status_code=400, detail="Invalid input")
-        else:
-            logger.info(f"iikae_request: {iikae_request}")
+    fingerprint = fingerprint_request(iikae_request)
+    cached_content = await get_stored_content(session, iikae_request, fingerprint)
+    if cached_content is not None:
+        return StreamingResponse(
+            content_event_stream(cached_content), media_type="text/event-stream"
+        )
 
-        generated_texts = generated_message.split("\n\n")
+    client_rate_limiter.admit(client_key(request))
+    await session.commit()
+    paraphrase_stream = stream_paraphrases(iikae_request)
+    # wait for the first paraphrase so that invalid input is still reported
+    # with a proper status code instead of an error event
+    first_text = await paraphrase_stream.__anext__()
+
+    async def event_stream():
+        generated_texts = [first_text]
+        yield sse_event("paraphrase", {"index": 0, "content": first_text})
+        try:
+            async for generated_text in paraphrase_stream:
+                yield sse_event(
+                    "paraphrase",
+                    {"index": len(generated_texts), "content": generated_text},
+                )
+                generated_texts.append(generated_text)
+
+            async with get_db_session() as session:
+                content = await save_content(
+                    session, iikae_request, generated_texts, fingerprint
+                )
+        except Exception as e:
+            logger.exception(e)
+            detail = (
+                e.detail
+                if isinstance(e, HTTPException)
+                else "Failed to generate response"
+            )
+            yield sse_event("error", {"detail": detail})
+            return
+
+        yield sse_event("done", PostIikaeResponse(content=content).model_dump())
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@app.post(
+    "/iikae/jobs",
+    response_model=PostIikaeJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def post_iikae_job(
+    iikae_request: IikaeRequest,
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_db_session_for_depends),
+):
+    if settings.is_test:
+        response.headers["Location"] = f"/iikae/jobs/{TEST_IIKAE_JOB_ID}"
+        return PostIikaeJobResponse(
+            job_id=TEST_IIKAE_JOB_ID, status=JobStatus.succeeded
+        )
 
-        generated_texts = [
-            iikae_text.replace("---", "").strip() for iikae_text in generated_texts
-        ]
+    validate_iikae_request(iikae_request)
+    client_rate_limiter.admit(client_key(request))
+
+    job = await generation_job_queue.submit(session, iikae_request)
+    response.headers["Location"] = f"/iikae/jobs/{job.id}"
+    return PostIikaeJobResponse(job_id=job.id, status=job.status)
+
+
+@app.get("/iikae/jobs/{job_id}", response_model=GetIikaeJobResponse)
+async def get_iikae_job(
+    job_id: str, session: AsyncSession = Depends(get_db_session_for_depends)
+):
+    if settings.is_test:
+        return GetIikaeJobResponse(
+            job_id=job_id,
+            status=JobStatus.succeeded,
+            content=TEST_POST_IIKAE_RESPONSE.content,
+        )
+
+    job = await get_generation_job(session, job_id)
+    if job is None:
+        raise NotFoundError(detail="Job not found")
+
+    content = None
+    if job.content_id is not None:
+        content = (await get_content_by_id(session, job.content_id)).to_content()
+    return GetIikaeJobResponse(
+        job_id=job.id, status=job.status, content=content, error=job.error
+    )
+
+
+async def run_generation_job(job: GenerationJob) -> str:
+    iikae_request = IikaeRequest(who=job.who, what=job.what, detail=job.detail)
+    fingerprint = fingerprint_request(iikae_request)
+    async with get_db_session() as session:
+        cached_content = await get_stored_content(session, iikae_request, fingerprint)
+    if cached_content is not None:
+        return cached_content.content_id
+
+    # no connection is held while waiting for the model; the workers are
+    # already bounded, so they wait for the limiter instead of being shed
+    generated_texts = await generate_paraphrases(iikae_request, wait=True)
+    async with get_db_session() as session:
+        content = await save_content(
+            session, iikae_request, generated_texts, fingerprint
+        )
+    return content.content_id
 
-        logger.info(f"generated_texts: {generated_texts}")
 
-        if len(generated_texts) == NUM_PARAPHRASES_PER_CONTENT:
-            logger.info("Successfully generated response")
-            break
-        elif i + 1 == MAX_RETRIES:
-            raise Exception("Failed to generate response")
-        else:
-            logger.warning("Failed to generate response. Retrying...")
+generation_job_queue.set_handler(run_generation_job)
 
-    input = create_input(
+
+async def get_stored_content(
+    session: AsyncSession, iikae_request: IikaeRequest, fingerprint: str
+) -> Content | None:
+    # the content of the same request, or else of a similar enough one, so
+    # that the model is not asked again
+    content = await get_cached_content(session, fingerprint)
+    if content is not None:
+        record_llm_call_avoided("exact")
+        return content
+
+    # not cached under this fingerprint, since the content is another request's
+    content = await find_similar_content(session, iikae_request)
+    if content is not None:
+        record_llm_call_avoided("similar")
+    return content
+
+
+async def content_event_stream(content: Content):
+    # a stored content, streamed like a generation that finished at once
+    for i, paraphrase in enumerate(content.paraphrases):
+        yield sse_event("paraphrase", {"index": i, "content": paraphrase.content})
+    yield sse_event("done", PostIikaeResponse(content=content).model_dump())
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def save_content(
+    session: AsyncSession,
+    iikae_request: IikaeRequest,
+    generated_texts: list[str],
+    fingerprint: str,
+) -> Content:
+    content = await create_content(
         session,
         who=iikae_request.who,
         what=iikae_request.what,
         detail=iikae_request.detail,
+        paraphrases=generated_texts,
+        fingerprint=fingerprint,
     )
-    paraphrases: list[Paraphrase] = []
-    for generated_text in generated_texts:
-        paraphrases.append(create_paraphrase(session, input.id, generated_text))
-
-    return PostIikaeResponse(
-        content=Content(
-            content_id=input.id,
-            who=input.who,
-            what=input.what,
-            detail=input.detail,
-            paraphrases=[
-                {
-                    "paraphrase_id": paraphrase.id,
-                    "content": paraphrase.content,
-                    "vote_count": paraphrase.vote_count,
-                }
-                for paraphrase in paraphrases
-            ],
-        )
-    )
+    cache_content(fingerprint, content)
+    invalidate_latest_pages()
+    ranking_index.add_content(content.content_id, datetime.utcnow())
+    search_index.add_content(content)
+    similarity_index.add_content(content)
+    return content
 
 
-def add_vote_count_background(session: Session, paraphrase_id: str):
-    add_vote_count(session, paraphrase_id)
+def json_response(body: bytes) -> Response:
+    return Response(body, media_type="application/json")
 
 
 @app.post("/vote/")
-async def vote(
-    vote_request: VoteRequest,
-    background_tasks: BackgroundTasks,
-    session: Session = Depends(get_db_session_for_depends),
-):
-    # タスクをバックグラウンドで実行
-    background_tasks.add_task(
-        add_vote_count_background, session, vote_request.paraphrase_id
-    )
+async def vote(vote_request: VoteRequest, request: Request):
+    # repeated votes are acknowledged like the first one but not counted
+    if vote_deduplicator.admit(request, vote_request.paraphrase_id):
+        vote_buffer.add(vote_request.paraphrase_id)
     return {"message": "success"}
 
 
 @app.get("/contents/", response_model=GetContentsResponse)
 async def get_contents(
     pagination: Pagination = Depends(),
-    order_by: str = "latest",
-    session: Session = Depends(get_db_session_for_depends),
+    order_by: OrderBy = OrderBy.latest,
+    session: AsyncSession = Depends(get_db_session_for_depends),
 ):
-    contents = get_contents_by_order(
-        session,
-        page=pagination.page,
-        per_page=pagination.per_page,
-        order_by=order_by,
+    # the response is encoded from the rows directly, so the response_model
+    # only documents it
+    cached_page = get_cached_page(
+        order_by, pagination.page, pagination.per_page, pagination.cursor
+    )
+    if cached_page is not None:
+        return json_response(encode_contents_response(*cached_page))
+
+    # ranking and hot pages are read from the in-memory index instead of
+    # sorting the table on every request
+    if order_by == OrderBy.latest:
+        contents, next_cursor = await get_contents_by_order(
+            session,
+            page=pagination.page,
+            per_page=pagination.per_page,
+            order_by=order_by,
+            cursor=pagination.cursor,
+        )
+    else:
+        contents, next_cursor = await get_ranked_contents(
+            session,
+            order_by,
+            page=pagination.page,
+            per_page=pagination.per_page,
+            cursor=pagination.cursor,
+        )
+    cache_page(
+        order_by,
+        pagination.page,
+        pagination.per_page,
+        pagination.cursor,
+        contents,
+        next_cursor,
     )
-    return GetContentsResponse(contents=contents)
+    return json_response(encode_contents_response(contents, next_cursor))
+
+
+# declared before /contents/{content_id}/ so that "batch" and "search" are not
+# taken as ids
+@app.get("/contents/batch/", response_model=GetContentsBatchResponse)
+async def get_contents_batch(
+    ids: str, session: AsyncSession = Depends(get_db_session_for_depends)
+):
+    # comma separated, duplicates are returned once
+    content_ids = list(dict.fromkeys(id for id in ids.split(",") if id))
+    if not content_ids:
+        raise ValidationError(detail="No ids given")
+    if len(content_ids) > settings.max_batch_contents:
+        raise ValidationError(
+            detail=f"At most {settings.max_batch_contents} ids can be given"
+        )
+
+    contents = await get_contents_by_ids(session, content_ids)
+    found_ids = {content.content_id for content in contents}
+    return json_response(
+        encode_contents_batch_response(
+            contents, [id for id in content_ids if id not in found_ids]
+        )
+    )
+
+
+@app.get("/contents/search/", response_model=SearchContentsResponse)
+async def search(
+    q: str,
+    page: int = Query(1, ge=1),
+    per_page: int = Query(10, ge=1, le=MAX_PER_PAGE),
+    session: AsyncSession = Depends(get_db_session_for_depends),
+):
+    contents, total = await search_contents(session, q, page, per_page)
+    return json_response(encode_search_response(contents, total))
 
 
 @app.get("/contents/{content_id}/", response_model=Content)
 async def get_content(
-    content_id: str, session: Session = Depends(get_db_session_for_depends)
+    content_id: str, session: AsyncSession = Depends(get_db_session_for_depends)
 ):
-    content = get_content_by_id(session, content_id)
-    return content
+    content = await get_content_by_id(session, content_id)
+    return json_response(encode_content(content))
+
+
+@app.get("/stats/")
+async def stats():
+    return get_stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(
+        render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
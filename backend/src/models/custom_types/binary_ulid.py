@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from typing import Any, Optional
+
+import ulid
+from sqlalchemy.types import BINARY, TypeDecorator
+from ulid import base32
+
+
+def new_ulid() -> str:
+    return ulid.new().str.lower()
+
+
+def new_ulids(count: int) -> list[str]:
+    # ids made in the same millisecond are ordered by their random part, so
+    # ids that have to sort in the order they were made, like the paraphrases
+    # of a content, count up from one random start instead
+    first = ulid.new().int
+    return [ulid.from_int(first + i).str.lower() for i in range(count)]
+
+
+class BinaryULID(TypeDecorator):
+    # ULIDs are stored as their 16 bytes, which sort like the strings do, and
+    # are the lowercase strings everywhere outside the database
+    impl = BINARY
+    cache_ok = True
+
+    def __init__(self) -> None:
+        super().__init__(16)
+
+    def process_bind_param(self, value: Any, dialect: Any) -> Optional[bytes]:
+        if value is None:
+            return None
+        try:
+            return base32.decode_ulid(value)
+        except ValueError:
+            # ids from requests that are not ULIDs match no row
+            return b""
+
+    def process_result_value(self, value: Any, dialect: Any) -> Optional[str]:
+        if value is None:
+            return None
+        return base32.encode_ulid(value).lower()
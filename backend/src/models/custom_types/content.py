@@ -15,3 +15,48 @@ class Content(BaseModel):
     what: str
     detail: str
     paraphrases: list[Paraphrase]
+
+
+class ParaphraseRow:
+    # plain counterparts of Paraphrase and Content for the read path, which
+    # encodes them to JSON directly instead of going through pydantic
+    __slots__ = ("paraphrase_id", "content", "vote_count")
+
+    def __init__(self, paraphrase_id: str, content: str, vote_count: int) -> None:
+        self.paraphrase_id = paraphrase_id
+        self.content = content
+        self.vote_count = vote_count
+
+
+class ContentRow:
+    __slots__ = ("content_id", "who", "what", "detail", "paraphrases")
+
+    def __init__(
+        self,
+        content_id: str,
+        who: str,
+        what: str,
+        detail: str,
+        paraphrases: list[ParaphraseRow],
+    ) -> None:
+        self.content_id = content_id
+        self.who = who
+        self.what = what
+        self.detail = detail
+        self.paraphrases = paraphrases
+
+    def to_content(self) -> Content:
+        return Content(
+            content_id=self.content_id,
+            who=self.who,
+            what=self.what,
+            detail=self.detail,
+            paraphrases=[
+                Paraphrase(
+                    paraphrase_id=paraphrase.paraphrase_id,
+                    content=paraphrase.content,
+                    vote_count=paraphrase.vote_count,
+                )
+                for paraphrase in self.paraphrases
+            ],
+        )
@@ -1,6 +1,32 @@
-from pydantic import BaseModel
+from __future__ import annotations
+
+import base64
+import json
+from typing import Any, Optional
+
+from pydantic import BaseModel, Field
+
+from core.constants import MAX_PER_PAGE
 
 
 class Pagination(BaseModel):
-    page: int = 1
-    per_page: int = 10
+    # pages are cached by their parameters, so their size is bounded too
+    page: int = Field(1, ge=1)
+    per_page: int = Field(10, ge=1, le=MAX_PER_PAGE)
+    cursor: Optional[str] = None
+
+
+def encode_cursor(*values: Any) -> str:
+    payload = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list[Any]:
+    padding = "=" * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
@@ -0,0 +1,10 @@
+from __future__ import annotations
+
+from pydantic import BaseModel
+
+from models.custom_types.content import Content
+
+
+class GetContentsBatchResponse(BaseModel):
+    contents: list[Content]
+    missing_ids: list[str]
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from typing import Optional
+
 from pydantic import BaseModel
 
 from models.custom_types.content import Content
@@ -7,3 +9,4 @@ from models.custom_types.content import Content
 
 class GetContentsResponse(BaseModel):
     contents: list[Content]
+    next_cursor: Optional[str] = None
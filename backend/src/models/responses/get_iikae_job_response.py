@@ -0,0 +1,13 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+from core.constants import JobStatus
+from models.custom_types.content import Content
+
+
+class GetIikaeJobResponse(BaseModel):
+    job_id: str
+    status: JobStatus
+    content: Optional[Content] = None
+    error: Optional[str] = None
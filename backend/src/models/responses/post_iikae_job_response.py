@@ -0,0 +1,8 @@
+from pydantic import BaseModel
+
+from core.constants import JobStatus
+
+
+class PostIikaeJobResponse(BaseModel):
+    job_id: str
+    status: JobStatus
@@ -0,0 +1,10 @@
+from __future__ import annotations
+
+from pydantic import BaseModel
+
+from models.custom_types.content import Content
+
+
+class SearchContentsResponse(BaseModel):
+    contents: list[Content]
+    total: int
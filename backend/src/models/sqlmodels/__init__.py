@@ -1,2 +1,6 @@
+from models.sqlmodels.archived_input import ArchivedInput
+from models.sqlmodels.archived_paraphrase import ArchivedParaphrase
+from models.sqlmodels.content_view import ContentView
+from models.sqlmodels.generation_job import GenerationJob
 from models.sqlmodels.input import Input
 from models.sqlmodels.paraphrase import Paraphrase
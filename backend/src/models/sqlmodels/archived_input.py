@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from sqlmodel import Column, DateTime, Field, SQLModel, func
+
+from models.custom_types.binary_ulid import BinaryULID
+
+
+class ArchivedInput(SQLModel, table=True):
+    # inputs moved out of "inputs" by the archiver; rows are copied as they
+    # are, so the ids are kept and no new ones are generated here
+    __tablename__ = "archived_inputs"
+
+    id: str = Field(sa_column=Column(BinaryULID(), primary_key=True))
+    who: str = Field(max_length=200)
+    what: str = Field(max_length=500)
+    detail: str = Field(max_length=500)
+    vote_count: int = Field(default=0)
+    fingerprint: str = Field(default=None, max_length=64, nullable=True)
+    created_at: datetime = Field(sa_column=Column(DateTime(timezone=True)))
+    updated_at: datetime = Field(sa_column=Column(DateTime(timezone=True)))
+    deleted_at: datetime = Field(default=None, nullable=True)
+    archived_at: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), default=func.now())
+    )
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from sqlmodel import Column, DateTime, Field, ForeignKey, SQLModel
+
+from models.custom_types.binary_ulid import BinaryULID
+
+
+class ArchivedParaphrase(SQLModel, table=True):
+    __tablename__ = "archived_paraphrases"
+
+    id: str = Field(sa_column=Column(BinaryULID(), primary_key=True))
+    input_id: str = Field(
+        sa_column=Column(
+            BinaryULID(),
+            ForeignKey("archived_inputs.id"),
+            nullable=False,
+            index=True,
+        )
+    )
+    content: str = Field(max_length=500)
+    vote_count: int = Field(default=0)
+    ai_model: str = Field(max_length=50)
+    temperature: float
+    created_at: datetime = Field(sa_column=Column(DateTime(timezone=True)))
+    updated_at: datetime = Field(sa_column=Column(DateTime(timezone=True)))
+    deleted_at: datetime = Field(default=None, nullable=True)
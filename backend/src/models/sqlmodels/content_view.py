@@ -0,0 +1,27 @@
+from datetime import datetime
+
+from sqlmodel import Column, DateTime, Field, Index, SQLModel, Text
+
+from models.custom_types.binary_ulid import BinaryULID
+
+
+class ContentView(SQLModel, table=True):
+    # read model of a content, written with it: the texts and paraphrase ids,
+    # which never change, rendered once as JSON so that reads need no input or
+    # paraphrase columns; only the vote counts of the paraphrases and the
+    # deleted_at of the input, with which contents are soft-deleted, are read,
+    # by primary key. deleted_at here is only copied by the backfill.
+    __tablename__ = "content_views"
+    __table_args__ = (
+        Index(
+            "ix_content_views_deleted_at_created_at_id",
+            "deleted_at",
+            "created_at",
+            "id",
+        ),
+    )
+
+    id: str = Field(sa_column=Column(BinaryULID(), primary_key=True))
+    payload: str = Field(sa_column=Column(Text, nullable=False))
+    created_at: datetime = Field(sa_column=Column(DateTime(timezone=True)))
+    deleted_at: datetime = Field(default=None, nullable=True)
@@ -0,0 +1,32 @@
+from datetime import datetime
+
+import ulid
+from sqlmodel import Column, DateTime, Field, Index, SQLModel, func
+
+from core.constants import JobStatus
+
+
+class GenerationJob(SQLModel, table=True):
+    __tablename__ = "generation_jobs"
+    __table_args__ = (
+        Index("ix_generation_jobs_status_created_at", "status", "created_at"),
+    )
+
+    id: str = Field(primary_key=True, max_length=33)
+    who: str = Field(max_length=200)
+    what: str = Field(max_length=500)
+    detail: str = Field(max_length=500)
+    status: str = Field(default=JobStatus.queued.value, max_length=16)
+    attempts: int = Field(default=0)
+    content_id: str = Field(default=None, max_length=33, nullable=True)
+    error: str = Field(default=None, max_length=500, nullable=True)
+    created_at: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), default=func.now())
+    )
+    started_at: datetime = Field(default=None, nullable=True)
+    finished_at: datetime = Field(default=None, nullable=True)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.id = ulid.new().str.lower()
+        self.created_at = datetime.utcnow().replace(microsecond=0)
@@ -1,17 +1,23 @@
 from datetime import datetime
 
-import ulid
-from sqlmodel import Column, DateTime, Field, SQLModel, func
+from sqlmodel import Column, DateTime, Field, Index, SQLModel, func
+
+from models.custom_types.binary_ulid import BinaryULID, new_ulid
 
 
 class Input(SQLModel, table=True):
     __tablename__ = "inputs"
+    __table_args__ = (
+        Index("ix_inputs_deleted_at_created_at_id", "deleted_at", "created_at", "id"),
+        Index("ix_inputs_deleted_at_vote_count_id", "deleted_at", "vote_count", "id"),
+    )
 
-    id: str = Field(primary_key=True, max_length=33)
+    id: str = Field(sa_column=Column(BinaryULID(), primary_key=True))
     who: str = Field(max_length=200)
     what: str = Field(max_length=500)
     detail: str = Field(max_length=500)
     vote_count: int = Field(default=0)
+    fingerprint: str = Field(default=None, max_length=64, nullable=True, index=True)
     created_at: datetime = Field(
         sa_column=Column(DateTime(timezone=True), default=func.now())
     )
@@ -24,4 +30,7 @@ class Input(SQLModel, table=True):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.id = ulid.new().str.lower()
+        self.id = new_ulid()
+        # set here rather than by the database so that keyset cursors built
+        # from it compare equal to the stored value on every backend
+        self.created_at = datetime.utcnow().replace(microsecond=0)
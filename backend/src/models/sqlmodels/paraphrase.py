@@ -1,14 +1,19 @@
 from datetime import datetime
 
-import ulid
-from sqlmodel import Column, DateTime, Field, SQLModel, func
+from sqlmodel import Column, DateTime, Field, ForeignKey, SQLModel, func
+
+from models.custom_types.binary_ulid import BinaryULID, new_ulid
 
 
 class Paraphrase(SQLModel, table=True):
     __tablename__ = "paraphrases"
 
-    id: str = Field(primary_key=True, max_length=33)
-    input_id: str = Field(max_length=33, foreign_key="inputs.id")
+    id: str = Field(sa_column=Column(BinaryULID(), primary_key=True))
+    input_id: str = Field(
+        sa_column=Column(
+            BinaryULID(), ForeignKey("inputs.id"), nullable=False, index=True
+        )
+    )
     content: str = Field(max_length=500)
     vote_count: int = Field(default=0)
     ai_model: str = Field(max_length=50)
@@ -25,4 +30,4 @@ class Paraphrase(SQLModel, table=True):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.id = ulid.new().str.lower()
+        self.id = kwargs.get("id") or new_ulid()
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import and_, delete, func, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.sqlmodels.archived_input import ArchivedInput
+from models.sqlmodels.archived_paraphrase import ArchivedParaphrase
+from models.sqlmodels.content_view import ContentView
+from models.sqlmodels.input import Input
+from models.sqlmodels.paraphrase import Paraphrase
+
+
+async def get_deleted_input_ids(session: AsyncSession, limit: int) -> list[str]:
+    result = await session.scalars(
+        select(Input.id).where(Input.deleted_at.is_not(None)).limit(limit)
+    )
+    return list(result)
+
+
+async def get_archivable_inputs(
+    session: AsyncSession,
+    created_before: datetime,
+    max_vote_count: int,
+    limit: int,
+    after: tuple[datetime, str] | None = None,
+) -> list[tuple[str, datetime]]:
+    # oldest first along ix_inputs_deleted_at_created_at_id; contents with more
+    # votes are skipped and stay in the primary tables, so a run continues
+    # after the last candidate instead of scanning them again every batch
+    query = (
+        select(Input.id, Input.created_at)
+        .where(Input.deleted_at.is_(None))
+        .where(Input.created_at < created_before)
+        .where(Input.vote_count <= max_vote_count)
+        .order_by(Input.created_at, Input.id)
+        .limit(limit)
+    )
+    if after is not None:
+        after_created_at, after_id = after
+        query = query.where(
+            or_(
+                Input.created_at > after_created_at,
+                and_(Input.created_at == after_created_at, Input.id > after_id),
+            )
+        )
+    return [tuple(row) for row in await session.execute(query)]
+
+
+async def archive_contents(session: AsyncSession, input_ids: list[str]) -> int:
+    # copies the inputs and their paraphrases and deletes the originals in one
+    # short transaction, so a content is always in exactly one of the tables
+    if not input_ids:
+        return 0
+
+    input_columns = [column.name for column in Input.__table__.columns]
+    paraphrase_columns = [column.name for column in Paraphrase.__table__.columns]
+    result = await session.execute(
+        insert(ArchivedInput.__table__).from_select(
+            input_columns + ["archived_at"],
+            select(
+                *(Input.__table__.c[name] for name in input_columns), func.now()
+            ).where(Input.id.in_(input_ids)),
+        )
+    )
+    await session.execute(
+        insert(ArchivedParaphrase.__table__).from_select(
+            paraphrase_columns,
+            select(
+                *(Paraphrase.__table__.c[name] for name in paraphrase_columns)
+            ).where(Paraphrase.input_id.in_(input_ids)),
+        )
+    )
+    # archived contents are read from their rows, they have no view
+    await session.execute(delete(ContentView).where(ContentView.id.in_(input_ids)))
+    await session.execute(delete(Paraphrase).where(Paraphrase.input_id.in_(input_ids)))
+    await session.execute(delete(Input).where(Input.id.in_(input_ids)))
+    await session.commit()
+    return result.rowcount
@@ -1,86 +1,378 @@
 from __future__ import annotations
 
+import json
+from datetime import datetime
+from typing import Any
 
-from sqlalchemy import desc
-from sqlalchemy.orm import Session
+from sqlalchemy import Row, Select, and_, desc, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.constants import NUM_PARAPHRASES_PER_CONTENT, OrderBy
-from models.custom_types.content import Content, Paraphrase as ParaphraseType
+from core.constants import AI_MODEL, TEMPERATURE, OrderBy
+from core.exceptions import DuplicatedError, NotFoundError, ValidationError
+from models.custom_types.binary_ulid import new_ulids
+from models.custom_types.content import Content, ContentRow
+from models.custom_types.content import Paraphrase as ParaphraseType
+from models.custom_types.content import ParaphraseRow
+from models.custom_types.pagination import decode_cursor, encode_cursor
+from models.sqlmodels.archived_input import ArchivedInput
+from models.sqlmodels.archived_paraphrase import ArchivedParaphrase
+from models.sqlmodels.content_view import ContentView
 from models.sqlmodels.input import Input
 from models.sqlmodels.paraphrase import Paraphrase
 
 
-def get_contents_by_order(
-    session: Session,
+async def create_content(
+    session: AsyncSession,
+    who: str,
+    what: str,
+    detail: str,
+    paraphrases: list[str],
+    fingerprint: str | None = None,
+) -> Content:
+    try:
+        input = Input(
+            who=who,
+            what=what,
+            detail=detail,
+            fingerprint=fingerprint,
+        )
+        # in generation order, which is the order they are read back in
+        paraphrase_rows = [
+            Paraphrase(
+                id=id,
+                input_id=input.id,
+                content=paraphrase,
+                ai_model=AI_MODEL,
+                temperature=TEMPERATURE,
+            )
+            for id, paraphrase in zip(new_ulids(len(paraphrases)), paraphrases)
+        ]
+        # build the response before committing so that the expired rows are
+        # not refreshed one by one afterwards
+        content = Content(
+            content_id=input.id,
+            who=who,
+            what=what,
+            detail=detail,
+            paraphrases=[
+                ParaphraseType(
+                    paraphrase_id=paraphrase.id,
+                    content=paraphrase.content,
+                    vote_count=0,
+                )
+                for paraphrase in paraphrase_rows
+            ],
+        )
+
+        # the paraphrases are inserted with a single executemany in the same
+        # transaction as the input, and so is the read model
+        session.add(input)
+        await session.flush()
+        session.add_all(paraphrase_rows)
+        session.add(
+            ContentView(
+                id=input.id,
+                payload=render_view_payload(
+                    who,
+                    what,
+                    detail,
+                    [
+                        (paraphrase.id, paraphrase.content)
+                        for paraphrase in paraphrase_rows
+                    ],
+                ),
+                created_at=input.created_at,
+            )
+        )
+        await session.commit()
+        return content
+    except IntegrityError as e:
+        raise DuplicatedError(detail=str(e.orig))
+    except Exception as e:
+        raise e
+
+
+async def get_contents_by_order(
+    session: AsyncSession,
     page: int = 0,
     per_page: int = 10,
     order_by: OrderBy = OrderBy.latest,
-) -> list[Content]:
-    order_column = Input.created_at
+    cursor: str | None = None,
+) -> tuple[list[ContentRow], str | None]:
+    # only the columns of the response and the cursor, as plain rows rather
+    # than entities in the identity map; latest pages are read from the
+    # content views, ranking ones from the inputs, which hold the vote counts
     if order_by == OrderBy.ranking:
-        order_column = Input.vote_count
+        table = Input.__table__
+        order_column = table.c.vote_count
+        columns = [table.c.id, table.c.who, table.c.what, table.c.detail]
+    else:
+        table = ContentView.__table__
+        order_column = table.c.created_at
+        columns = [table.c.id, table.c.payload]
 
-    query_result = (
-        session.query(Input, Paraphrase)
-        .join(
-            Paraphrase,
-            Input.id == Paraphrase.input_id,
+    query = (
+        select(*columns, order_column)
+        .where(table.c.deleted_at.is_(None))
+        .order_by(desc(order_column), desc(table.c.id))
+    )
+    if order_by != OrderBy.ranking:
+        query = _with_live_inputs(query)
+    if cursor is not None:
+        cursor_key, cursor_id = _decode_order_cursor(cursor, order_by)
+        query = query.where(
+            or_(
+                order_column < cursor_key,
+                and_(order_column == cursor_key, table.c.id < cursor_id),
+            )
         )
-        .filter(Input.deleted_at.is_(None))
-        .order_by(desc(order_column))
-        .offset((page - 1) * per_page * NUM_PARAPHRASES_PER_CONTENT)
-        .limit(per_page * NUM_PARAPHRASES_PER_CONTENT)
-        .all()
+    else:
+        query = query.offset((page - 1) * per_page)
+
+    # fetch one more row to know whether there is a next page
+    rows = list((await session.execute(query.limit(per_page + 1))).all())
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = _encode_order_cursor(rows[-1], order_by)
+
+    if order_by == OrderBy.ranking:
+        return await _build_contents(session, rows), next_cursor
+    return await _build_view_contents(session, rows), next_cursor
+
+
+def _encode_order_cursor(input: Row, order_by: OrderBy) -> str:
+    if order_by == OrderBy.ranking:
+        return encode_cursor(input.vote_count, input.id)
+    return encode_cursor(input.created_at.isoformat(), input.id)
+
+
+def _decode_order_cursor(cursor: str, order_by: OrderBy) -> tuple[Any, str]:
+    try:
+        cursor_key, cursor_id = decode_cursor(cursor)
+        if order_by == OrderBy.ranking:
+            return int(cursor_key), str(cursor_id)
+        return datetime.fromisoformat(cursor_key), str(cursor_id)
+    except (TypeError, ValueError):
+        raise ValidationError(detail="Invalid cursor")
+
+
+def _select_inputs(input_model: type[Input] | type[ArchivedInput]) -> Select:
+    table = input_model.__table__
+    return select(table.c.id, table.c.who, table.c.what, table.c.detail).where(
+        table.c.deleted_at.is_(None)
+    )
+
+
+async def _build_contents(
+    session: AsyncSession,
+    inputs: list[Row],
+    paraphrase_model: type[Paraphrase] | type[ArchivedParaphrase] = Paraphrase,
+) -> list[ContentRow]:
+    # inputs are rows with id, who, what and detail; their paraphrases are
+    # fetched with one IN query rather than joined onto every input row
+    if not inputs:
+        return []
+
+    table = paraphrase_model.__table__
+    paraphrases = await session.execute(
+        select(table.c.input_id, table.c.id, table.c.content, table.c.vote_count)
+        .where(table.c.input_id.in_([input.id for input in inputs]))
+        .order_by(table.c.input_id, table.c.id)
     )
+    paraphrases_by_input_id: dict[str, list[ParaphraseRow]] = {}
+    for input_id, id, content, vote_count in paraphrases:
+        paraphrases_by_input_id.setdefault(input_id, []).append(
+            ParaphraseRow(id, content, vote_count)
+        )
 
-    contents: list[Content] = []
-    for input, paraphrase in query_result:
-        paraphrase = ParaphraseType(
-            paraphrase_id=paraphrase.id,
-            content=paraphrase.content,
-            vote_count=paraphrase.vote_count,
+    return [
+        ContentRow(
+            input.id,
+            input.who,
+            input.what,
+            input.detail,
+            paraphrases_by_input_id[input.id],
         )
-        if contents and contents[-1].content_id == input.id:
-            contents[-1].paraphrases.append(paraphrase)
-        else:
-            contents.append(
-                Content(
-                    content_id=input.id,
-                    who=input.who,
-                    what=input.what,
-                    detail=input.detail,
-                    paraphrases=[paraphrase],
+        for input in inputs
+        if input.id in paraphrases_by_input_id
+    ]
+
+
+def render_view_payload(
+    who: str, what: str, detail: str, paraphrases: list[tuple[str, str]]
+) -> str:
+    # the payload of a content view; paraphrases are (id, content)
+    return json.dumps(
+        {
+            "who": who,
+            "what": what,
+            "detail": detail,
+            # in generation order, which is also their id order
+            "paraphrases": paraphrases,
+        },
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+
+
+async def _build_view_contents(
+    session: AsyncSession, views: list[Row]
+) -> list[ContentRow]:
+    # views are rows with id and payload; the live vote counts of their
+    # paraphrases are overlaid with one primary key lookup
+    if not views:
+        return []
+
+    payloads = [(view.id, json.loads(view.payload)) for view in views]
+    table = Paraphrase.__table__
+    vote_counts = dict(
+        (
+            await session.execute(
+                select(table.c.id, table.c.vote_count).where(
+                    table.c.id.in_(
+                        [
+                            paraphrase_id
+                            for _, payload in payloads
+                            for paraphrase_id, _ in payload["paraphrases"]
+                        ]
+                    )
                 )
             )
+        ).all()
+    )
 
+    contents = []
+    for id, payload in payloads:
+        paraphrases = [
+            ParaphraseRow(paraphrase_id, content, vote_counts[paraphrase_id])
+            for paraphrase_id, content in payload["paraphrases"]
+            if paraphrase_id in vote_counts
+        ]
+        # contents archived since the view was read have no paraphrases left
+        if paraphrases:
+            contents.append(
+                ContentRow(
+                    id, payload["who"], payload["what"], payload["detail"], paraphrases
+                )
+            )
     return contents
 
 
-def get_content_by_id(session: Session, content_id: str) -> Content:
-    query_result = (
-        session.query(Input, Paraphrase)
-        .join(
-            Paraphrase,
-            Input.id == Paraphrase.input_id,
-        )
-        .filter(Input.id == content_id)
-        .filter(Input.deleted_at.is_(None))
-        .all()
+async def get_contents_by_ids(
+    session: AsyncSession, content_ids: list[str]
+) -> list[ContentRow]:
+    if not content_ids:
+        return []
+
+    views = await session.execute(
+        _select_views().where(ContentView.__table__.c.id.in_(content_ids))
     )
-    input: Input = query_result[0][0]
-    content = Content(
-        content_id=content_id,
-        who=input.who,
-        what=input.what,
-        detail=input.detail,
-        paraphrases=[],
+    contents_by_id = {
+        content.content_id: content
+        for content in await _build_view_contents(session, list(views.all()))
+    }
+    missing_ids = [id for id in content_ids if id not in contents_by_id]
+    if missing_ids:
+        contents_by_id.update(await _get_input_contents_by_ids(session, missing_ids))
+    return [
+        contents_by_id[content_id]
+        for content_id in content_ids
+        if content_id in contents_by_id
+    ]
+
+
+def _select_views() -> Select:
+    table = ContentView.__table__
+    return _with_live_inputs(
+        select(table.c.id, table.c.payload).where(table.c.deleted_at.is_(None))
+    )
+
+
+def _with_live_inputs(query: Select) -> Select:
+    # contents are soft-deleted by setting deleted_at on their input, so reads
+    # of the views look it up by primary key as well
+    views = ContentView.__table__
+    inputs = Input.__table__
+    return query.join_from(views, inputs, views.c.id == inputs.c.id).where(
+        inputs.c.deleted_at.is_(None)
     )
-    for _, paraphrase in query_result:
-        paraphrase = ParaphraseType(
-            paraphrase_id=paraphrase.id,
-            content=paraphrase.content,
-            vote_count=paraphrase.vote_count,
+
+
+async def _get_input_contents_by_ids(
+    session: AsyncSession, content_ids: list[str]
+) -> dict[str, ContentRow]:
+    # contents without a view, like archived ones, are built from their rows
+    inputs = await session.execute(
+        _select_inputs(Input).where(Input.__table__.c.id.in_(content_ids))
+    )
+    contents_by_id = {
+        content.content_id: content
+        for content in await _build_contents(session, list(inputs.all()))
+    }
+    missing_ids = [id for id in content_ids if id not in contents_by_id]
+    if missing_ids:
+        # permalinks to archived contents keep working
+        archived_inputs = await session.execute(
+            _select_inputs(ArchivedInput).where(
+                ArchivedInput.__table__.c.id.in_(missing_ids)
+            )
         )
-        content.paraphrases.append(paraphrase)
+        for content in await _build_contents(
+            session, list(archived_inputs.all()), ArchivedParaphrase
+        ):
+            contents_by_id[content.content_id] = content
+    return contents_by_id
+
+
+async def get_content_by_id(session: AsyncSession, content_id: str) -> ContentRow:
+    contents = await get_contents_by_ids(session, [content_id])
+    if not contents:
+        raise NotFoundError(detail="Content not found")
+    return contents[0]
+
 
-    return content
+async def get_content_by_fingerprint(
+    session: AsyncSession, fingerprint: str
+) -> Content | None:
+    input_id = await session.scalar(
+        select(Input.id)
+        .where(Input.fingerprint == fingerprint)
+        .where(Input.deleted_at.is_(None))
+        .order_by(desc(Input.created_at))
+        .limit(1)
+    )
+    if input_id is None:
+        return None
+
+    contents = await get_contents_by_ids(session, [input_id])
+    return contents[0].to_content() if contents else None
+
+
+async def get_content_texts(
+    session: AsyncSession, limit: int, after_id: str | None = None
+) -> list[tuple[str, list[str]]]:
+    # the searchable texts of the contents in id order, a batch at a time:
+    # who, what, detail and then the paraphrases
+    query = (
+        select(Input.id, Input.who, Input.what, Input.detail)
+        .where(Input.deleted_at.is_(None))
+        .order_by(Input.id)
+        .limit(limit)
+    )
+    if after_id is not None:
+        query = query.where(Input.id > after_id)
+    inputs = (await session.execute(query)).all()
+    if not inputs:
+        return []
+
+    paraphrases = await session.execute(
+        select(Paraphrase.input_id, Paraphrase.content)
+        .where(Paraphrase.input_id.in_([input.id for input in inputs]))
+        .order_by(Paraphrase.input_id, Paraphrase.id)
+    )
+    texts = {id: [who, what, detail] for id, who, what, detail in inputs}
+    for input_id, content in paraphrases:
+        texts[input_id].append(content)
+    return list(texts.items())
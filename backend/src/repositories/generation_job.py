@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.constants import JobStatus
+from models.sqlmodels.generation_job import GenerationJob
+
+
+async def create_generation_job(
+    session: AsyncSession, who: str, what: str, detail: str
+) -> GenerationJob:
+    job = GenerationJob(who=who, what=what, detail=detail)
+    session.add(job)
+    await session.commit()
+    return job
+
+
+async def get_generation_job(session: AsyncSession, id: str) -> GenerationJob | None:
+    return await session.get(GenerationJob, id)
+
+
+async def count_queued_generation_jobs(session: AsyncSession) -> int:
+    return await session.scalar(
+        select(func.count())
+        .select_from(GenerationJob)
+        .where(GenerationJob.status == JobStatus.queued.value)
+    )
+
+
+async def claim_generation_jobs(
+    session: AsyncSession, limit: int
+) -> list[GenerationJob]:
+    # oldest first; a job is only claimed by the worker whose UPDATE still
+    # finds it queued, so several processes can share the table
+    candidate_ids = (
+        await session.scalars(
+            select(GenerationJob.id)
+            .where(GenerationJob.status == JobStatus.queued.value)
+            .order_by(GenerationJob.created_at, GenerationJob.id)
+            .limit(limit)
+        )
+    ).all()
+
+    claimed_ids = []
+    for id in candidate_ids:
+        result = await session.execute(
+            update(GenerationJob)
+            .where(GenerationJob.id == id)
+            .where(GenerationJob.status == JobStatus.queued.value)
+            .values(
+                status=JobStatus.running.value,
+                attempts=GenerationJob.attempts + 1,
+                started_at=datetime.utcnow(),
+            )
+        )
+        if result.rowcount == 1:
+            claimed_ids.append(id)
+    await session.commit()
+
+    if not claimed_ids:
+        return []
+    jobs = await session.scalars(
+        select(GenerationJob)
+        .where(GenerationJob.id.in_(claimed_ids))
+        .order_by(GenerationJob.created_at, GenerationJob.id)
+    )
+    return list(jobs)
+
+
+async def finish_generation_job(
+    session: AsyncSession,
+    id: str,
+    status: JobStatus,
+    content_id: str | None = None,
+    error: str | None = None,
+) -> None:
+    await session.execute(
+        update(GenerationJob)
+        .where(GenerationJob.id == id)
+        .values(
+            status=status.value,
+            content_id=content_id,
+            error=error[:500] if error is not None else None,
+            finished_at=datetime.utcnow(),
+        )
+    )
+    await session.commit()
+
+
+async def requeue_generation_job(session: AsyncSession, id: str) -> None:
+    await session.execute(
+        update(GenerationJob)
+        .where(GenerationJob.id == id)
+        .values(status=JobStatus.queued.value, started_at=None)
+    )
+    await session.commit()
+
+
+async def requeue_stale_generation_jobs(session: AsyncSession, timeout: float) -> int:
+    # jobs left running by a process that stopped or crashed
+    result = await session.execute(
+        update(GenerationJob)
+        .where(GenerationJob.status == JobStatus.running.value)
+        .where(
+            GenerationJob.started_at < datetime.utcnow() - timedelta(seconds=timeout)
+        )
+        .values(status=JobStatus.queued.value, started_at=None)
+    )
+    await session.commit()
+    return result.rowcount
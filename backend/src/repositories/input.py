@@ -1,21 +1,31 @@
 from __future__ import annotations
 
+from datetime import datetime
+
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.exceptions import DuplicatedError
 from models.sqlmodels.input import Input
 
 
-def create_input(session: Session, who: str, what: str, detail: str) -> Input:
+async def create_input(
+    session: AsyncSession,
+    who: str,
+    what: str,
+    detail: str,
+    fingerprint: str | None = None,
+) -> Input:
     try:
         input = Input(
             who=who,
             what=what,
             detail=detail,
+            fingerprint=fingerprint,
         )
         session.add(input)
-        session.commit()
+        await session.commit()
         return input
     except IntegrityError as e:
         raise DuplicatedError(detail=str(e.orig))
@@ -23,13 +33,39 @@ def create_input(session: Session, who: str, what: str, detail: str) -> Input:
         raise e
 
 
-def get_input_by_id(session: Session, id: str) -> Input | None:
-    input = session.query(Input).filter(Input.id == id).first()
+async def get_input_by_id(session: AsyncSession, id: str) -> Input | None:
+    input = await session.scalar(select(Input).where(Input.id == id).limit(1))
     return input
 
 
-def update_vote_count(session: Session, input: Input, vote_count: int) -> Input:
+async def update_vote_count(
+    session: AsyncSession, input: Input, vote_count: int
+) -> Input:
     input.vote_count = vote_count
     session.add(input)
-    session.commit()
+    await session.commit()
     return input
+
+
+async def get_vote_counts(session: AsyncSession) -> list[tuple[str, int, datetime]]:
+    result = await session.execute(
+        select(Input.id, Input.vote_count, Input.created_at).where(
+            Input.deleted_at.is_(None)
+        )
+    )
+    return [tuple(row) for row in result]
+
+
+async def get_input_texts(
+    session: AsyncSession, limit: int, after_id: str | None = None
+) -> list[tuple[str, str, str, str]]:
+    # id, who, what and detail of the inputs in id order, a batch at a time
+    query = (
+        select(Input.id, Input.who, Input.what, Input.detail)
+        .where(Input.deleted_at.is_(None))
+        .order_by(Input.id)
+        .limit(limit)
+    )
+    if after_id is not None:
+        query = query.where(Input.id > after_id)
+    return [tuple(row) for row in await session.execute(query)]
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+from sqlalchemy import bindparam, select, update
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.constants import AI_MODEL, TEMPERATURE
 from core.exceptions import DuplicatedError
@@ -9,7 +10,9 @@ from models.sqlmodels.input import Input
 from models.sqlmodels.paraphrase import Paraphrase
 
 
-def create_paraphrase(session: Session, input_id: str, paraphrase: str) -> Paraphrase:
+async def create_paraphrase(
+    session: AsyncSession, input_id: str, paraphrase: str
+) -> Paraphrase:
     try:
         paraphrase = Paraphrase(
             input_id=input_id,
@@ -18,7 +21,7 @@ def create_paraphrase(session: Session, input_id: str, paraphrase: str) -> Parap
             temperature=TEMPERATURE,
         )
         session.add(paraphrase)
-        session.commit()
+        await session.commit()
         return paraphrase
     except IntegrityError as e:
         raise DuplicatedError(detail=str(e.orig))
@@ -26,20 +29,67 @@ def create_paraphrase(session: Session, input_id: str, paraphrase: str) -> Parap
         raise e
 
 
-def get_paraphrases_by_input_id(session: Session, input_id: str) -> list[Paraphrase]:
-    paraphrases = (
-        session.query(Paraphrase).filter(Paraphrase.input_id == input_id).all()
+async def get_paraphrases_by_input_id(
+    session: AsyncSession, input_id: str
+) -> list[Paraphrase]:
+    paraphrases = await session.scalars(
+        select(Paraphrase).where(Paraphrase.input_id == input_id)
     )
-    return paraphrases
+    return list(paraphrases.all())
 
 
-def add_vote_count(session: Session, paraphrase_id: str) -> Paraphrase:
-    paraphrase = (
-        session.query(Paraphrase).filter(Paraphrase.id == paraphrase_id).first()
+async def add_vote_count(session: AsyncSession, paraphrase_id: str) -> Paraphrase:
+    paraphrase = await session.scalar(
+        select(Paraphrase).where(Paraphrase.id == paraphrase_id).limit(1)
     )
     paraphrase.vote_count += 1
     input_id = paraphrase.input_id
-    input = session.query(Input).filter(Input.id == input_id).first()
+    input = await session.scalar(select(Input).where(Input.id == input_id).limit(1))
     input.vote_count += 1
-    session.commit()
+    await session.commit()
     return paraphrase
+
+
+async def add_vote_counts(
+    session: AsyncSession, vote_counts: dict[str, int]
+) -> dict[str, int]:
+    paraphrase_rows = (
+        await session.execute(
+            select(Paraphrase.id, Paraphrase.input_id)
+            .where(Paraphrase.id.in_(vote_counts.keys()))
+            .order_by(Paraphrase.id)
+        )
+    ).all()
+    if not paraphrase_rows:
+        return {}
+
+    input_vote_counts: dict[str, int] = {}
+    for paraphrase_id, input_id in paraphrase_rows:
+        input_vote_counts[input_id] = (
+            input_vote_counts.get(input_id, 0) + vote_counts[paraphrase_id]
+        )
+
+    # rows are updated in primary key order so that concurrent flushes from
+    # other workers lock them in the same order
+    paraphrases = Paraphrase.__table__
+    await session.execute(
+        update(paraphrases)
+        .where(paraphrases.c.id == bindparam("paraphrase_id"))
+        .values(vote_count=paraphrases.c.vote_count + bindparam("count")),
+        [
+            {"paraphrase_id": paraphrase_id, "count": vote_counts[paraphrase_id]}
+            for paraphrase_id, _ in paraphrase_rows
+        ],
+    )
+    inputs = Input.__table__
+    await session.execute(
+        update(inputs)
+        .where(inputs.c.id == bindparam("input_id"))
+        .values(vote_count=inputs.c.vote_count + bindparam("count")),
+        [
+            {"input_id": input_id, "count": count}
+            for input_id, count in sorted(input_vote_counts.items())
+        ],
+    )
+    await session.commit()
+    return input_vote_counts
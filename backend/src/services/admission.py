@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from time import perf_counter
+from typing import Any, AsyncIterator, Optional
+
+from fastapi import HTTPException, Request, status
+
+from core.cache import LRUCache
+from core.config import settings
+from core.exceptions import ServiceUnavailableError, TooManyRequestsError
+
+
+class AdaptiveLimiter:
+    # AIMD window over concurrent generations: it grows by one per window of
+    # completions that were on time and shrinks by a quarter when a completion
+    # is slower than the target or times out. Requests over the window wait in
+    # a short queue and are shed when it is full or they waited too long.
+    def __init__(self) -> None:
+        # read from the settings on first use
+        self.limit: Optional[float] = None
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = 0
+        self.increases = 0
+        self.decreases = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._decreased_at = 0.0
+
+    @asynccontextmanager
+    async def acquire(self, wait: bool = False) -> AsyncIterator[None]:
+        # with wait, the request queues for as long as it takes instead of being
+        # shed, for callers that are already bounded such as the job workers
+        await self._admit(wait)
+        started_at = perf_counter()
+        overloaded = False
+        try:
+            yield
+        except HTTPException as e:
+            overloaded = e.status_code == status.HTTP_504_GATEWAY_TIMEOUT
+            raise
+        finally:
+            self._release(started_at, overloaded)
+
+    async def _admit(self, wait: bool) -> None:
+        if self.limit is None:
+            self.limit = float(settings.max_concurrent_generations)
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+
+        if not wait and len(self._waiters) >= settings.generation_queue_size:
+            self._shed()
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            # the slot is handed over by _release
+            await asyncio.wait_for(
+                future, None if wait else settings.generation_queue_timeout
+            )
+        except asyncio.TimeoutError:
+            if future in self._waiters:
+                self._waiters.remove(future)
+            self._shed()
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.in_flight -= 1
+                self._wake()
+            elif future in self._waiters:
+                self._waiters.remove(future)
+            raise
+
+    def _shed(self) -> None:
+        self.shed += 1
+        raise ServiceUnavailableError(
+            detail="Too many generations in progress", headers={"Retry-After": "1"}
+        )
+
+    def _release(self, started_at: float, overloaded: bool) -> None:
+        utilized = self.in_flight >= int(self.limit)
+        self.in_flight -= 1
+        elapsed = perf_counter() - started_at
+        if overloaded or elapsed > settings.generation_latency_target:
+            # only completions that started after the last decrease reflect it
+            if started_at > self._decreased_at:
+                self.limit = max(
+                    float(settings.min_concurrent_generations), self.limit * 0.75
+                )
+                self._decreased_at = perf_counter()
+                self.decreases += 1
+        elif utilized and self.limit < settings.max_concurrent_generations:
+            self.limit = min(
+                float(settings.max_concurrent_generations), self.limit + 1 / self.limit
+            )
+            self.increases += 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            future = self._waiters.popleft()
+            if future.done():
+                continue
+            self.in_flight += 1
+            self.admitted += 1
+            future.set_result(None)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "limit": self.limit or float(settings.max_concurrent_generations),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
+
+
+class ClientRateLimiter:
+    # a token bucket per client: CLIENT_GENERATION_BURST generations at once,
+    # refilled at CLIENT_GENERATION_RATE per second
+    def __init__(self) -> None:
+        self.rejected = 0
+
+    @functools.cached_property
+    def _buckets(self) -> LRUCache:
+        # least recently seen clients are forgotten, which only resets them to
+        # a full bucket
+        return LRUCache(maxsize=settings.client_bucket_cache_size)
+
+    def admit(self, client: str) -> None:
+        rate = settings.client_generation_rate
+        burst = float(settings.client_generation_burst)
+        now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = [burst, now]
+            self._buckets.set(client, bucket)
+
+        tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            self.rejected += 1
+            raise TooManyRequestsError(
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil((1 - tokens) / rate))},
+            )
+        bucket[0] = tokens - 1
+
+    def stats(self) -> dict[str, Any]:
+        return {"clients": len(self._buckets), "rejected": self.rejected}
+
+
+def client_key(request: Request) -> str:
+    # each proxy appends the address it got the request from, so only the last
+    # TRUSTED_PROXY_DEPTH forwarded addresses can be trusted; the first of them
+    # is the client, whatever the client itself sent before it
+    depth = settings.trusted_proxy_depth
+    forwarded_for = ",".join(request.headers.getlist("x-forwarded-for"))
+    if depth > 0 and forwarded_for:
+        addresses = [address.strip() for address in forwarded_for.split(",")]
+        return addresses[max(len(addresses) - depth, 0)]
+    return request.client.host if request.client is not None else "unknown"
+
+
+generation_limiter = AdaptiveLimiter()
+client_rate_limiter = ClientRateLimiter()
+
+
+def get_admission_stats() -> dict[str, Any]:
+    return {
+        "generation": generation_limiter.stats(),
+        "clients": client_rate_limiter.stats(),
+    }
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from time import perf_counter
+from typing import Any, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from core.config import settings
+from core.db_settings import get_db_session
+from repositories.archive import (
+    archive_contents,
+    get_archivable_inputs,
+    get_deleted_input_ids,
+)
+from services.ranking_index import ranking_index
+from services.search_index import search_index
+from services.similarity_index import similarity_index
+
+logger = logging.getLogger("uvicorn")
+
+
+class ContentArchiver:
+    # moves old, rarely voted and soft-deleted contents out of the primary
+    # tables in small batches, each in its own transaction, with a pause in
+    # between so that the row locks are short and requests get the database
+    def __init__(self) -> None:
+        self.runs = 0
+        self.archived = 0
+        self.conflicts = 0
+        self.last_run_seconds = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        if settings.archive_interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(settings.archive_interval)
+            try:
+                archived = await self.run_once()
+            except Exception:
+                logger.exception("Failed to archive contents")
+                continue
+            if archived:
+                logger.info("Archived %d contents", archived)
+
+    async def run_once(self) -> int:
+        started_at = perf_counter()
+        batch_size = settings.archive_batch_size
+        archived = 0
+        try:
+            while True:
+                async with get_db_session() as session:
+                    input_ids = await get_deleted_input_ids(session, batch_size)
+                if not input_ids:
+                    break
+                archived += await self._archive_batch(input_ids)
+
+            created_before = datetime.utcnow() - timedelta(
+                days=settings.archive_after_days
+            )
+            after = None
+            while True:
+                async with get_db_session() as session:
+                    rows = await get_archivable_inputs(
+                        session,
+                        created_before,
+                        settings.archive_max_vote_count,
+                        batch_size,
+                        after,
+                    )
+                if not rows:
+                    break
+                archived += await self._archive_batch([id for id, _ in rows])
+                after = rows[-1][1], rows[-1][0]
+        except IntegrityError:
+            # another process is archiving the same rows; it finishes the run
+            self.conflicts += 1
+            logger.warning("Stopped archiving, the rows are already archived")
+
+        self.runs += 1
+        self.archived += archived
+        self.last_run_seconds = perf_counter() - started_at
+        return archived
+
+    async def _archive_batch(self, input_ids: list[str]) -> int:
+        async with get_db_session() as session:
+            archived = await archive_contents(session, input_ids)
+        ranking_index.remove_contents(input_ids)
+        search_index.remove_contents(input_ids)
+        similarity_index.remove_contents(input_ids)
+        await asyncio.sleep(settings.archive_batch_pause)
+        return archived
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "archived": self.archived,
+            "conflicts": self.conflicts,
+            "last_run_seconds": self.last_run_seconds,
+        }
+
+
+content_archiver = ContentArchiver()
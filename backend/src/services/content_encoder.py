@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import functools
+from typing import Any, Iterable, Optional
+
+import orjson
+
+from core.cache import LRUCache
+from core.config import settings
+from models.custom_types.content import ContentRow
+
+# same output as FastAPI's JSONResponse for the pydantic models: compact,
+# non-ASCII characters as UTF-8 and the fields in declaration order
+
+
+@functools.cache
+def get_fragment_cache() -> LRUCache:
+    return LRUCache(maxsize=settings.content_fragment_cache_size)
+
+
+def _build_fragment(content: ContentRow) -> tuple[bytes, ...]:
+    # everything of a content but its vote counts, split where the vote counts
+    # go; the text and the paraphrases of a content never change
+    head = orjson.dumps(
+        {
+            "content_id": content.content_id,
+            "who": content.who,
+            "what": content.what,
+            "detail": content.detail,
+        }
+    )
+    pieces = []
+    separator = head[:-1] + b',"paraphrases":['
+    for paraphrase in content.paraphrases:
+        encoded = orjson.dumps(
+            {"paraphrase_id": paraphrase.paraphrase_id, "content": paraphrase.content}
+        )
+        pieces.append(separator + encoded[:-1] + b',"vote_count":')
+        separator = b"},"
+    # without paraphrases, the separator is still the head of the content
+    pieces.append(b"}]}" if content.paraphrases else separator + b"]}")
+    return tuple(pieces)
+
+
+def encode_content(content: ContentRow) -> bytes:
+    fragment_cache = get_fragment_cache()
+    fragment = fragment_cache.get(content.content_id)
+    if fragment is None or len(fragment) != len(content.paraphrases) + 1:
+        fragment = _build_fragment(content)
+        fragment_cache.set(content.content_id, fragment)
+
+    parts = []
+    for piece, paraphrase in zip(fragment, content.paraphrases):
+        parts.append(piece)
+        parts.append(b"%d" % paraphrase.vote_count)
+    parts.append(fragment[-1])
+    return b"".join(parts)
+
+
+def encode_contents(contents: Iterable[ContentRow]) -> bytes:
+    return b"[" + b",".join(encode_content(content) for content in contents) + b"]"
+
+
+def encode_contents_response(
+    contents: Iterable[ContentRow], next_cursor: Optional[str]
+) -> bytes:
+    # GetContentsResponse
+    return (
+        b'{"contents":'
+        + encode_contents(contents)
+        + b',"next_cursor":'
+        + orjson.dumps(next_cursor)
+        + b"}"
+    )
+
+
+def encode_contents_batch_response(
+    contents: Iterable[ContentRow], missing_ids: list[str]
+) -> bytes:
+    # GetContentsBatchResponse
+    return (
+        b'{"contents":'
+        + encode_contents(contents)
+        + b',"missing_ids":'
+        + orjson.dumps(missing_ids)
+        + b"}"
+    )
+
+
+def get_fragment_cache_stats() -> dict[str, Any]:
+    return get_fragment_cache().stats()
+
+
+def encode_search_response(contents: Iterable[ContentRow], total: int) -> bytes:
+    # SearchContentsResponse
+    return b'{"contents":' + encode_contents(contents) + b',"total":%d}' % total
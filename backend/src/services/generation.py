@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import logging
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, AsyncIterator
+
+from fastapi import HTTPException, status
+
+from core.config import settings
+from core.constants import AI_MODEL, NUM_PARAPHRASES_PER_CONTENT, TEMPERATURE
+from core.exceptions import ValidationError
+from core.logging import SAMPLED
+from core.metrics import record_llm_call, record_llm_repair, record_llm_retry
+from models.requests.iikae_request import IikaeRequest
+from services.admission import generation_limiter
+from services.paraphrase_parser import ParaphraseStreamParser, parse_paraphrases
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger("uvicorn")
+
+MAX_RETRIES = 3
+
+completions = 0
+retries = 0
+repairs = 0
+
+# structured output, see services/paraphrase_parser.py
+RESPONSE_FORMAT = {"type": "json_object"}
+
+SYSTEM_MESSAGE = """
+# 役割
+あなたは人々が抱える「言いにくいこと」を面白く言い換える天才です。
+
+# 指示
+ユーザが入力した「言いにくいこと」を、例え話などを盛り込み面白く言い換えてください。
+回答はアプローチを変えて3パターンで簡潔に、3つ目の回答は関西弁でお願いします。
+回答は {"paraphrases": ["1つ目の回答", "2つ目の回答", "3つ目の回答"]} の形のJSONで返してください。
+もしもユーザーの入力が[誰に] [言いたいこと] [詳しく] と関係ないものや公序良俗に反するものであったり、[詳しく] に正しい文章が書かれていないときは {"invalid": true} とだけ返答してください。
+
+# 例1
+ユーザー：
+---
+[誰に]
+会社のお偉いさん
+
+[言いたいこと]
+カツラずれてますよ
+
+[詳しく]
+たまに会社のお偉いさんと一緒にゴルフに行くことがあるが、よくカツラがずれていて気まずい
+---
+
+あなた：
+{"paraphrases": ["今日の風、なかなかのやんちゃ坊主ですね。お帽子の下の小鳥さんが巣立ちそうになってますよ。", "今のプレイは素晴らしかったですね。でも、どうやら頭上の草原が少し南に移動しているようです。風のせいかもしれませんね。", "社長さん、今日の頭ん上、ちょっとお出かけモードやないですか？カツラさんが、\"今日はこっち行こか～\"って、ちょっとお散歩してるみたいですわ。"]}
+
+# 例2
+ユーザー：
+---
+[誰に]
+友達
+
+[言いたいこと]
+おはよう
+
+[詳しく]
+あああ
+---
+
+あなた：
+{"invalid": true}
+"""
+
+# created on first use; benchmarks and tests may assign a stand-in beforehand
+client: AsyncOpenAI | None = None
+
+
+def _get_client() -> AsyncOpenAI:
+    global client
+    if client is None:
+        # imported here since openai alone takes about half a second to import
+        from openai import AsyncOpenAI
+
+        # the SDK would retry failed and timed out calls twice on its own, while
+        # holding the generation slot; retries are left to the callers instead
+        client = AsyncOpenAI(
+            api_key=settings.openai_api_key.get_secret_value(),
+            timeout=settings.openai_timeout,
+            max_retries=0,
+        )
+    return client
+
+
+def validate_iikae_request(iikae_request: IikaeRequest) -> None:
+    # limit the text length
+    if (
+        len(iikae_request.what) > 100
+        or len(iikae_request.who) > 100
+        or len(iikae_request.detail) > 200
+    ):
+        raise ValidationError(detail="Text length is too long")
+
+
+def build_messages(iikae_request: IikaeRequest) -> list[dict[str, str]]:
+    text = f"""
+[言いたいこと]
+{iikae_request.what}
+
+[相手]
+{iikae_request.who}
+
+[詳しく]
+{iikae_request.detail}
+"""
+    return [
+        {
+            "role": "system",
+            "content": SYSTEM_MESSAGE,
+        },
+        {
+            "role": "user",
+            "content": text,
+        },
+    ]
+
+
+async def stream_paraphrases(iikae_request: IikaeRequest) -> AsyncIterator[str]:
+    from openai import APITimeoutError
+
+    messages = build_messages(iikae_request)
+    parser = ParaphraseStreamParser()
+    num_paraphrases = 0
+
+    async with generation_limiter.acquire():
+        started_at = perf_counter()
+        try:
+            stream = await _get_client().chat.completions.create(
+                model=AI_MODEL,
+                temperature=TEMPERATURE,
+                messages=messages,
+                response_format=RESPONSE_FORMAT,
+                stream=True,
+            )
+            logger.info("iikae_request: %s", iikae_request, extra=SAMPLED)
+            async for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                texts = parser.feed(chunk.choices[0].delta.content)
+                if parser.invalid:
+                    logger.info("Got invalid input: %s", iikae_request)
+                    raise HTTPException(status_code=400, detail="Invalid input")
+                for text in texts:
+                    num_paraphrases += 1
+                    if num_paraphrases <= NUM_PARAPHRASES_PER_CONTENT:
+                        yield text
+        except APITimeoutError:
+            logger.warning("Generation timed out")
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="Generation timed out",
+            )
+        finally:
+            _record_completion(perf_counter() - started_at)
+
+    result = parser.close()
+    if result.invalid:
+        logger.info("Got invalid input: %s", iikae_request)
+        raise HTTPException(status_code=400, detail="Invalid input")
+    if result.repaired:
+        _record_repair()
+    for text in result.paraphrases:
+        num_paraphrases += 1
+        if num_paraphrases <= NUM_PARAPHRASES_PER_CONTENT:
+            yield text
+
+    if num_paraphrases < NUM_PARAPHRASES_PER_CONTENT:
+        logger.warning("Got %d paraphrases from the stream", num_paraphrases)
+        raise Exception("Failed to generate response")
+
+
+async def generate_paraphrases(
+    iikae_request: IikaeRequest, wait: bool = False
+) -> list[str]:
+    from openai import APITimeoutError
+
+    messages = build_messages(iikae_request)
+
+    async with generation_limiter.acquire(wait):
+        for i in range(MAX_RETRIES):
+            started_at = perf_counter()
+            try:
+                completion = await _get_client().chat.completions.create(
+                    model=AI_MODEL,
+                    temperature=TEMPERATURE,
+                    messages=messages,
+                    response_format=RESPONSE_FORMAT,
+                )
+            except APITimeoutError:
+                logger.warning("Generation timed out")
+                raise HTTPException(
+                    status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                    detail="Generation timed out",
+                )
+            finally:
+                _record_completion(perf_counter() - started_at)
+
+            result = parse_paraphrases(completion.choices[0].message.content or "")
+
+            if result.invalid:
+                logger.info("Got invalid input: %s", iikae_request)
+                raise HTTPException(status_code=400, detail="Invalid input")
+            else:
+                logger.info("iikae_request: %s", iikae_request, extra=SAMPLED)
+
+            logger.info("generated_texts: %s", result.paraphrases, extra=SAMPLED)
+
+            # near misses are repaired by the parser, so only outputs with too
+            # few paraphrases are generated again
+            if len(result.paraphrases) == NUM_PARAPHRASES_PER_CONTENT:
+                if result.repaired:
+                    _record_repair()
+                logger.info("Successfully generated response")
+                return result.paraphrases
+            elif i + 1 == MAX_RETRIES:
+                raise Exception("Failed to generate response")
+            else:
+                logger.warning("Failed to generate response. Retrying...")
+                _record_retry()
+
+
+def _record_completion(seconds: float) -> None:
+    global completions
+    completions += 1
+    record_llm_call(seconds)
+
+
+def _record_retry() -> None:
+    global retries
+    retries += 1
+    record_llm_retry()
+
+
+def _record_repair() -> None:
+    global repairs
+    repairs += 1
+    record_llm_repair()
+
+
+def get_generation_stats() -> dict[str, Any]:
+    return {
+        "completions": completions,
+        "retries": retries,
+        "repairs": repairs,
+        "retry_ratio": retries / completions if completions else 0.0,
+    }
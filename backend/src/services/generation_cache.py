@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+import json
+import unicodedata
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.cache import LRUCache
+from core.config import settings
+from models.custom_types.content import Content
+from models.requests.iikae_request import IikaeRequest
+from repositories.content import get_content_by_fingerprint
+
+
+@functools.cache
+def get_generation_cache() -> LRUCache:
+    return LRUCache(
+        maxsize=settings.generation_cache_size, ttl=settings.generation_cache_ttl
+    )
+
+
+db_hits = 0
+db_misses = 0
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).split()).lower()
+
+
+def fingerprint_request(iikae_request: IikaeRequest) -> str:
+    normalized = [
+        normalize_text(iikae_request.who),
+        normalize_text(iikae_request.what),
+        normalize_text(iikae_request.detail),
+    ]
+    payload = json.dumps(normalized, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+async def get_cached_content(session: AsyncSession, fingerprint: str) -> Content | None:
+    global db_hits, db_misses
+
+    content = get_generation_cache().get(fingerprint)
+    if content is not None:
+        return content
+
+    content = await get_content_by_fingerprint(session, fingerprint)
+    if content is None:
+        db_misses += 1
+        return None
+
+    db_hits += 1
+    get_generation_cache().set(fingerprint, content)
+    return content
+
+
+def cache_content(fingerprint: str, content: Content) -> None:
+    get_generation_cache().set(fingerprint, content)
+
+
+def get_generation_cache_stats() -> dict[str, Any]:
+    return {
+        "memory": get_generation_cache().stats(),
+        "db": {"hits": db_hits, "misses": db_misses},
+    }
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.constants import JobStatus
+from core.db_settings import get_db_session
+from core.exceptions import ServiceUnavailableError
+from models.requests.iikae_request import IikaeRequest
+from models.sqlmodels.generation_job import GenerationJob
+from repositories.generation_job import (
+    claim_generation_jobs,
+    count_queued_generation_jobs,
+    create_generation_job,
+    finish_generation_job,
+    requeue_generation_job,
+    requeue_stale_generation_jobs,
+)
+
+logger = logging.getLogger("uvicorn")
+
+# how often jobs left running by a stopped process are looked for
+STALE_CHECK_INTERVAL = 60.0
+# jobs running for longer than GENERATION_JOB_TIMEOUT are requeued, even if a
+# worker is still on them, so a worker gives up on a job well before that
+JOB_RUN_TIMEOUT_RATIO = 0.5
+# invalid input fails the same way every time; timeouts and other server
+# errors are retried
+TERMINAL_STATUS_CODES = {
+    status.HTTP_400_BAD_REQUEST,
+    status.HTTP_422_UNPROCESSABLE_ENTITY,
+}
+
+
+class GenerationJobQueue:
+    def __init__(self) -> None:
+        self.submitted = 0
+        self.rejected = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.requeued = 0
+        # moving average of the job duration, used for Retry-After
+        self.average_seconds = 5.0
+        self._handler: Optional[Callable[[GenerationJob], Awaitable[str]]] = None
+        self._running: set[asyncio.Task] = set()
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self._checked_stale_at = 0.0
+
+    def set_handler(self, handler: Callable[[GenerationJob], Awaitable[str]]) -> None:
+        # the handler generates and saves the content of a job and returns its id
+        self._handler = handler
+
+    async def submit(
+        self, session: AsyncSession, iikae_request: IikaeRequest
+    ) -> GenerationJob:
+        queued = await count_queued_generation_jobs(session)
+        if queued >= settings.max_queued_generation_jobs:
+            self.rejected += 1
+            raise ServiceUnavailableError(
+                detail="Too many queued jobs",
+                headers={"Retry-After": str(self.retry_after(queued))},
+            )
+
+        job = await create_generation_job(
+            session,
+            who=iikae_request.who,
+            what=iikae_request.what,
+            detail=iikae_request.detail,
+        )
+        self.submitted += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    def retry_after(self, queued: int) -> int:
+        # seconds until the workers have worked through the queue
+        workers = settings.generation_workers
+        return max(1, math.ceil(queued * self.average_seconds / workers))
+
+    def start(self) -> None:
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._stopping = True
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        # running jobs are put back into the queue for the next process
+        for task in list(self._running):
+            task.cancel()
+        await asyncio.gather(*self._running, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await self._dispatch()
+            except Exception:
+                logger.exception("Failed to dispatch generation jobs")
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), settings.generation_job_poll_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _dispatch(self) -> None:
+        if time.monotonic() - self._checked_stale_at > STALE_CHECK_INTERVAL:
+            self._checked_stale_at = time.monotonic()
+            async with get_db_session() as session:
+                stale = await requeue_stale_generation_jobs(
+                    session, settings.generation_job_timeout
+                )
+            if stale:
+                logger.warning("Requeued %d stale generation jobs", stale)
+
+        free = settings.generation_workers - len(self._running)
+        if free <= 0 or self._handler is None:
+            return
+        async with get_db_session() as session:
+            jobs = await claim_generation_jobs(session, free)
+        for job in jobs:
+            task = asyncio.create_task(self._run_job(job))
+            self._running.add(task)
+            task.add_done_callback(self._job_done)
+
+    def _job_done(self, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        # a worker is free again
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run_job(self, job: GenerationJob) -> None:
+        if job.attempts > settings.generation_job_max_attempts:
+            await self._finish(job.id, JobStatus.failed, error="Too many attempts")
+            return
+
+        started_at = perf_counter()
+        try:
+            content_id = await asyncio.wait_for(
+                self._handler(job),
+                settings.generation_job_timeout * JOB_RUN_TIMEOUT_RATIO,
+            )
+        except asyncio.CancelledError:
+            await asyncio.shield(self._requeue(job.id))
+            raise
+        except asyncio.TimeoutError:
+            logger.warning("Generation job %s timed out", job.id)
+            await self._retry(job, "Generation timed out")
+            return
+        except HTTPException as e:
+            if e.status_code in TERMINAL_STATUS_CODES:
+                await self._finish(job.id, JobStatus.failed, error=str(e.detail))
+            else:
+                logger.warning("Generation job %s failed: %s", job.id, e.detail)
+                await self._retry(job, str(e.detail))
+            return
+        except Exception:
+            logger.exception("Generation job %s failed", job.id)
+            await self._retry(job, "Failed to generate response")
+            return
+
+        self.average_seconds = 0.9 * self.average_seconds + 0.1 * (
+            perf_counter() - started_at
+        )
+        await self._finish(job.id, JobStatus.succeeded, content_id=content_id)
+
+    async def _retry(self, job: GenerationJob, error: str) -> None:
+        if job.attempts < settings.generation_job_max_attempts:
+            await self._requeue(job.id)
+        else:
+            await self._finish(job.id, JobStatus.failed, error=error)
+
+    async def _finish(
+        self,
+        id: str,
+        status: JobStatus,
+        content_id: str | None = None,
+        error: str | None = None,
+    ) -> None:
+        async with get_db_session() as session:
+            await finish_generation_job(session, id, status, content_id, error)
+        if status == JobStatus.succeeded:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+
+    async def _requeue(self, id: str) -> None:
+        async with get_db_session() as session:
+            await requeue_generation_job(session, id)
+        self.requeued += 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "running": len(self._running),
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "requeued": self.requeued,
+            "average_seconds": self.average_seconds,
+        }
+
+
+generation_job_queue = GenerationJobQueue()
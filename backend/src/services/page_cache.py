@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import functools
+from typing import Any, Hashable, Optional
+
+from core.cache import LRUCache
+from core.config import settings
+from core.constants import OrderBy
+from models.custom_types.content import ContentRow
+
+
+@functools.cache
+def get_page_cache() -> LRUCache:
+    return LRUCache(maxsize=settings.page_cache_size)
+
+
+def _page_key(
+    order_by: OrderBy, page: int, per_page: int, cursor: Optional[str]
+) -> Hashable:
+    # the page number is ignored when a cursor is given
+    return (order_by, cursor, page if cursor is None else None, per_page)
+
+
+# pages are kept as rows rather than encoded bytes so that vote counts can be
+# patched in place
+Page = tuple[list[ContentRow], Optional[str]]
+
+
+def get_cached_page(
+    order_by: OrderBy, page: int, per_page: int, cursor: Optional[str]
+) -> Page | None:
+    return get_page_cache().get(_page_key(order_by, page, per_page, cursor))
+
+
+def cache_page(
+    order_by: OrderBy,
+    page: int,
+    per_page: int,
+    cursor: Optional[str],
+    contents: list[ContentRow],
+    next_cursor: Optional[str],
+) -> None:
+    # ranking and hot pages are reordered by votes, so they only live for a
+    # short time
+    if order_by != OrderBy.latest:
+        ttl = settings.ranking_page_cache_ttl
+    else:
+        ttl = settings.latest_page_cache_ttl
+    get_page_cache().set(
+        _page_key(order_by, page, per_page, cursor), (contents, next_cursor), ttl=ttl
+    )
+
+
+def invalidate_latest_pages() -> None:
+    get_page_cache().invalidate_where(lambda key: key[0] == OrderBy.latest)
+
+
+def apply_vote_counts(
+    vote_counts: dict[str, int], input_vote_counts: dict[str, int]
+) -> None:
+    for contents, _ in get_page_cache().values():
+        for content in contents:
+            if content.content_id not in input_vote_counts:
+                continue
+            for paraphrase in content.paraphrases:
+                paraphrase.vote_count += vote_counts.get(paraphrase.paraphrase_id, 0)
+
+
+def get_page_cache_stats() -> dict[str, Any]:
+    return get_page_cache().stats()
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, NamedTuple, Optional
+
+from core.constants import NUM_PARAPHRASES_PER_CONTENT
+
+# what the model used to answer with before structured output, still accepted
+INVALID_INPUT_MESSAGE = "無効な入力かい！"
+
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+_TRAILING_COMMA = re.compile(r",\s*([\]}])")
+_ARRAY_START = re.compile(r'"paraphrases"\s*:\s*\[')
+_INVALID_FLAG = re.compile(r'"invalid"\s*:\s*true')
+_LIST_MARKER = re.compile(r"^\s*(?:\d+[.)．、]|[-・*])\s*")
+
+
+class ParseResult(NamedTuple):
+    paraphrases: list[str]
+    invalid: bool = False
+    # True when the output was not the requested JSON but could be used anyway
+    repaired: bool = False
+
+
+def parse_paraphrases(text: str) -> ParseResult:
+    text = text.strip()
+    result = _from_json(_load_json(text))
+    if result is not None:
+        return _fit(result, repaired=False)
+
+    # near misses: code fences, surrounding prose, trailing commas
+    stripped = _CODE_FENCE.sub("", text)
+    start = min(
+        (i for i in (stripped.find("{"), stripped.find("[")) if i >= 0), default=-1
+    )
+    end = max(stripped.rfind("}"), stripped.rfind("]"))
+    if start >= 0 and end > start:
+        candidate = _TRAILING_COMMA.sub(r"\1", stripped[start : end + 1])
+        result = _from_json(_load_json(candidate))
+        if result is not None:
+            return _fit(result, repaired=True)
+
+    if _INVALID_FLAG.search(text) or INVALID_INPUT_MESSAGE in text:
+        return ParseResult([], invalid=True, repaired=True)
+
+    # truncated JSON: keep the strings that were completed
+    match = _ARRAY_START.search(text)
+    if match is not None:
+        paraphrases, _, _ = scan_strings(text, match.end())
+        return _fit(ParseResult(paraphrases), repaired=True)
+
+    # JSON that could not be read is not taken apart as plain text
+    if stripped.startswith(("{", "[")):
+        return _fit(ParseResult([]), repaired=True)
+
+    # plain text, one paraphrase per paragraph as in the old prompt
+    paragraphs = [
+        _LIST_MARKER.sub("", paragraph.replace("---", ""))
+        for paragraph in re.split(r"\n\s*\n", stripped)
+    ]
+    return _fit(ParseResult(paragraphs), repaired=True)
+
+
+def _load_json(text: str) -> Any:
+    try:
+        # the model sometimes puts raw line breaks inside the strings
+        return json.loads(text, strict=False)
+    except ValueError:
+        return None
+
+
+def _from_json(data: Any) -> Optional[ParseResult]:
+    repaired = False
+    if isinstance(data, dict):
+        if data.get("invalid") is True:
+            return ParseResult([], invalid=True)
+        paraphrases = data.get("paraphrases")
+        if paraphrases is None:
+            # the right shape under another key
+            paraphrases = next(
+                (value for value in data.values() if isinstance(value, list)), None
+            )
+            repaired = True
+        data = paraphrases
+    else:
+        # a bare array
+        repaired = True
+    if not isinstance(data, list):
+        return None
+
+    paraphrases = [item for item in data if isinstance(item, str)]
+    if len(paraphrases) != len(data):
+        return None
+    return ParseResult(paraphrases, repaired=repaired)
+
+
+def _fit(result: ParseResult, repaired: bool) -> ParseResult:
+    repaired = repaired or result.repaired
+    if result.invalid:
+        return result._replace(repaired=repaired)
+
+    paraphrases = [text.strip() for text in result.paraphrases]
+    paraphrases = [text for text in paraphrases if text]
+    if any(INVALID_INPUT_MESSAGE in text for text in paraphrases):
+        return ParseResult([], invalid=True, repaired=repaired)
+    if len(paraphrases) != len(result.paraphrases):
+        repaired = True
+    if len(paraphrases) > NUM_PARAPHRASES_PER_CONTENT:
+        paraphrases = paraphrases[:NUM_PARAPHRASES_PER_CONTENT]
+        repaired = True
+    return ParseResult(paraphrases, repaired=repaired)
+
+
+def scan_strings(text: str, position: int) -> tuple[list[str], int, bool]:
+    # reads the complete string literals of a JSON array from position on;
+    # returns them, where to continue and whether the array has ended
+    strings = []
+    while position < len(text):
+        char = text[position]
+        if char in " \t\r\n,":
+            position += 1
+        elif char == '"':
+            end = position + 1
+            while end < len(text) and text[end] != '"':
+                end += 2 if text[end] == "\\" else 1
+            if end >= len(text):
+                break
+            literal = _load_json(text[position : end + 1])
+            if isinstance(literal, str):
+                strings.append(literal)
+            position = end + 1
+        else:
+            # "]" or something that is not a string
+            return strings, position, True
+    return strings, position, False
+
+
+class ParaphraseStreamParser:
+    # yields the paraphrases of {"paraphrases": [...]} as each string completes
+    def __init__(self) -> None:
+        self.invalid = False
+        self._buffer = ""
+        self._position: Optional[int] = None
+        self._ended = False
+        self._num_yielded = 0
+
+    def feed(self, delta: str) -> list[str]:
+        self._buffer += delta
+        if self._position is None:
+            match = _ARRAY_START.search(self._buffer)
+            if match is None:
+                if _INVALID_FLAG.search(self._buffer):
+                    self.invalid = True
+                return []
+            self._position = match.end()
+        if self._ended:
+            return []
+
+        strings, self._position, self._ended = scan_strings(
+            self._buffer, self._position
+        )
+        texts = [text.strip() for text in strings if text.strip()]
+        self._num_yielded += len(texts)
+        return texts
+
+    def close(self) -> ParseResult:
+        # the rest of the output, repaired if needed
+        result = parse_paraphrases(self._buffer)
+        self.invalid = self.invalid or result.invalid
+        return result._replace(paraphrases=result.paraphrases[self._num_yielded :])
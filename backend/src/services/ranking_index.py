@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import bisect
+import math
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.constants import HOT_DECAY_SECONDS, HOT_EPOCH, OrderBy
+from core.db_settings import get_db_session
+from core.exceptions import ValidationError
+from models.custom_types.content import ContentRow
+from models.custom_types.pagination import decode_cursor, encode_cursor
+from repositories.content import get_contents_by_ids
+from repositories.input import get_vote_counts
+from services.rebuilt_index import RebuiltIndex
+
+
+def hot_score(vote_count: int, created_at: float) -> float:
+    return math.log10(max(vote_count, 1)) + (created_at - HOT_EPOCH) / HOT_DECAY_SECONDS
+
+
+def _timestamp(created_at: datetime) -> float:
+    # created_at is stored as naive UTC
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at.timestamp()
+
+
+class ScoreIndex:
+    # (score, content_id) pairs kept sorted in ascending order; pages are read
+    # from the end so that the highest score comes first and ties are broken
+    # by the larger (newer) id, like ORDER BY score DESC, id DESC
+    def __init__(self) -> None:
+        self._keys: list[tuple[float, str]] = []
+        self._scores: dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, content_id: str) -> bool:
+        return content_id in self._scores
+
+    def score(self, content_id: str) -> Optional[float]:
+        return self._scores.get(content_id)
+
+    def rebuild(self, scores: dict[str, float]) -> None:
+        self._scores = scores
+        self._keys = sorted((score, content_id) for content_id, score in scores.items())
+
+    def set_score(self, content_id: str, score: float) -> None:
+        old_score = self._scores.get(content_id)
+        if old_score is not None:
+            position = bisect.bisect_left(self._keys, (old_score, content_id))
+            del self._keys[position]
+        self._scores[content_id] = score
+        bisect.insort(self._keys, (score, content_id))
+
+    def remove(self, content_id: str) -> None:
+        score = self._scores.pop(content_id, None)
+        if score is not None:
+            position = bisect.bisect_left(self._keys, (score, content_id))
+            del self._keys[position]
+
+    def page(self, offset: int, limit: int) -> list[tuple[float, str]]:
+        end = len(self._keys) - offset
+        if end <= 0:
+            return []
+        return self._keys[max(end - limit, 0) : end][::-1]
+
+    def page_after(
+        self, score: float, content_id: str, limit: int
+    ) -> list[tuple[float, str]]:
+        end = bisect.bisect_left(self._keys, (score, content_id))
+        return self._keys[max(end - limit, 0) : end][::-1]
+
+
+class _Rankings:
+    # both orders of the contents, and when each was created for hot scores
+    def __init__(self, rows: list[tuple[str, int, datetime]]) -> None:
+        self.ranking = ScoreIndex()
+        self.hot = ScoreIndex()
+        self.created_at = {
+            content_id: _timestamp(created) for content_id, _, created in rows
+        }
+        self.ranking.rebuild(
+            {content_id: vote_count for content_id, vote_count, _ in rows}
+        )
+        self.hot.rebuild(
+            {
+                content_id: hot_score(vote_count, self.created_at[content_id])
+                for content_id, vote_count, _ in rows
+            }
+        )
+
+    def add(self, content_id: str, created_at: float) -> None:
+        # the content may have been read with its votes already
+        if content_id in self.ranking:
+            return
+        self.created_at[content_id] = created_at
+        self.ranking.set_score(content_id, 0)
+        self.hot.set_score(content_id, hot_score(0, created_at))
+
+    def remove(self, content_ids: list[str]) -> None:
+        for content_id in content_ids:
+            self.ranking.remove(content_id)
+            self.hot.remove(content_id)
+            self.created_at.pop(content_id, None)
+
+    def add_votes(self, input_vote_counts: dict[str, int]) -> None:
+        for content_id, count in input_vote_counts.items():
+            vote_count = self.ranking.score(content_id)
+            if vote_count is None:
+                continue
+            vote_count += count
+            self.ranking.set_score(content_id, vote_count)
+            self.hot.set_score(
+                content_id, hot_score(vote_count, self.created_at[content_id])
+            )
+
+
+class RankingIndex(RebuiltIndex[_Rankings]):
+    name = "ranking"
+
+    def __init__(self) -> None:
+        super().__init__(_Rankings([]))
+
+    @property
+    def ranking(self) -> ScoreIndex:
+        return self._data.ranking
+
+    @property
+    def hot(self) -> ScoreIndex:
+        return self._data.hot
+
+    async def _load(self) -> _Rankings:
+        async with get_db_session() as session:
+            return _Rankings(await get_vote_counts(session))
+
+    def _rebuild_interval(self) -> float:
+        return settings.ranking_rebuild_interval
+
+    def add_content(self, content_id: str, created_at: datetime) -> None:
+        timestamp = _timestamp(created_at)
+        self._change(lambda rankings: rankings.add(content_id, timestamp))
+
+    def remove_contents(self, content_ids: list[str]) -> None:
+        # archived contents; other workers drop them at their next rebuild
+        self._change(lambda rankings: rankings.remove(content_ids))
+
+    def apply_vote_counts(
+        self, vote_counts: dict[str, int], input_vote_counts: dict[str, int]
+    ) -> None:
+        self._change(lambda rankings: rankings.add_votes(input_vote_counts))
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "size": len(self.ranking),
+            "rebuilds": self.rebuilds,
+            "last_rebuild_seconds": self.last_rebuild_seconds,
+        }
+
+
+ranking_index = RankingIndex()
+
+
+async def get_ranked_contents(
+    session: AsyncSession,
+    order_by: OrderBy,
+    page: int = 1,
+    per_page: int = 10,
+    cursor: str | None = None,
+) -> tuple[list[ContentRow], str | None]:
+    await ranking_index.ensure_ready()
+    index = ranking_index.hot if order_by == OrderBy.hot else ranking_index.ranking
+
+    # fetch one more entry to know whether there is a next page
+    if cursor is not None:
+        try:
+            cursor_score, cursor_id = decode_cursor(cursor)
+            entries = index.page_after(
+                float(cursor_score), str(cursor_id), per_page + 1
+            )
+        except (TypeError, ValueError):
+            raise ValidationError(detail="Invalid cursor")
+    else:
+        entries = index.page((page - 1) * per_page, per_page + 1)
+
+    next_cursor = None
+    if len(entries) > per_page:
+        entries = entries[:per_page]
+        next_cursor = encode_cursor(*entries[-1])
+
+    contents = await get_contents_by_ids(
+        session, [content_id for _, content_id in entries]
+    )
+    return contents, next_cursor
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from time import perf_counter
+from typing import Callable, Generic, Optional, TypeVar
+
+logger = logging.getLogger("uvicorn")
+
+T = TypeVar("T")
+
+
+class RebuiltIndex(Generic[T]):
+    # an in-memory index of the database, loaded on first use and again every
+    # rebuild interval. Subclasses load the data and make their changes with
+    # _change, which applies them at once and records them while a rebuild is
+    # reading the tables, to be replayed on the new data
+    name = "index"
+
+    def __init__(self, data: Optional[T] = None) -> None:
+        self.rebuilds = 0
+        self.last_rebuild_seconds = 0.0
+        self._data = data
+        self._ready = False
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._changes: Optional[list[Callable[[T], None]]] = None
+
+    async def _load(self) -> T:
+        raise NotImplementedError
+
+    def _rebuild_interval(self) -> float:
+        raise NotImplementedError
+
+    def _get_lock(self) -> asyncio.Lock:
+        # one rebuild at a time, since changes are recorded for the one running
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def ensure_ready(self) -> None:
+        if self._ready:
+            return
+        async with self._get_lock():
+            if not self._ready:
+                await self._rebuild()
+
+    async def rebuild(self) -> None:
+        async with self._get_lock():
+            await self._rebuild()
+
+    async def _rebuild(self) -> None:
+        started_at = perf_counter()
+        self._changes = []
+        try:
+            data = await self._load()
+        except BaseException:
+            self._changes = None
+            raise
+
+        for change in self._changes:
+            change(data)
+        self._changes = None
+        self._data = data
+        self._ready = True
+        self.rebuilds += 1
+        self.last_rebuild_seconds = perf_counter() - started_at
+
+    def _change(self, change: Callable[[T], None]) -> None:
+        if self._changes is not None:
+            self._changes.append(change)
+        if self._data is not None:
+            change(self._data)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        # changes made by other workers only reach this worker's index here
+        while True:
+            await asyncio.sleep(self._rebuild_interval())
+            try:
+                await self.rebuild()
+            except Exception:
+                logger.exception("Failed to rebuild the %s index", self.name)
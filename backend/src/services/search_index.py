@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import asyncio
+import re
+import unicodedata
+from array import array
+from typing import Any, Optional
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.db_settings import get_db_session
+from core.exceptions import ValidationError
+from models.custom_types.content import Content, ContentRow
+from repositories.content import get_content_texts, get_contents_by_ids
+from services.rebuilt_index import RebuiltIndex
+
+# who, what, detail and the paraphrases; a match in "what" counts the most
+FIELD_WEIGHTS = (2, 3, 1, 2)
+_FIELD_WEIGHTS = np.array(FIELD_WEIGHTS, dtype=np.int64)
+FIELD_BITS = 2
+REBUILD_BATCH_SIZE = 5000
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    # full-width letters and digits, half-width katakana and case are folded
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def bigrams(word: str) -> set[str]:
+    return {word[i : i + 2] for i in range(len(word) - 1)}
+
+
+def word_terms(word: str) -> set[str]:
+    # a single character word, like 母, is a term of its own
+    return bigrams(word) if len(word) > 1 else {word}
+
+
+def text_terms(text: str) -> set[str]:
+    # Japanese is not separated by spaces, so every pair of adjacent
+    # characters within a run of word characters is a term
+    grams: set[str] = set()
+    for word in _WORD.findall(normalize(text)):
+        grams.update(word_terms(word))
+    return grams
+
+
+def is_searchable(word: str) -> bool:
+    # single Latin letters and digits match too much to be searched for
+    return len(word) > 1 or not word.isascii()
+
+
+def _intersect(postings: list[np.ndarray]) -> np.ndarray:
+    # the postings are sorted, so the shortest one is looked up in the others
+    postings = sorted(postings, key=len)
+    result = postings[0]
+    for posting in postings[1:]:
+        positions = np.searchsorted(posting, result)
+        positions[positions == len(posting)] = 0
+        result = result[posting[positions] == result]
+        if not len(result):
+            break
+    return result
+
+
+class _Postings:
+    # documents are numbered in the order they are added and each posting is
+    # an array of 32-bit (document << FIELD_BITS | field) entries, which stays
+    # sorted because documents are only appended
+    def __init__(self) -> None:
+        self.terms: dict[str, array] = {}
+        # the terms each character is part of, to look up single characters
+        self.char_terms: dict[str, list[str]] = {}
+        self.content_ids: list[str] = []
+        self.documents: dict[str, int] = {}
+        self.removed: set[int] = set()
+        self.num_entries = 0
+        self._removed_cache: Optional[np.ndarray] = None
+
+    def add(self, content_id: str, texts: list[str]) -> None:
+        if content_id in self.documents:
+            return
+        document = len(self.content_ids)
+        self.content_ids.append(content_id)
+        self.documents[content_id] = document
+
+        # every paraphrase goes into the last field
+        last_field = len(FIELD_WEIGHTS) - 1
+        fields: list[set[str]] = [set() for _ in FIELD_WEIGHTS]
+        for i, text in enumerate(texts):
+            fields[min(i, last_field)].update(text_terms(text))
+        for field, grams in enumerate(fields):
+            entry = document << FIELD_BITS | field
+            for gram in grams:
+                posting = self.terms.get(gram)
+                if posting is None:
+                    posting = self.terms[gram] = array("I")
+                    for char in set(gram):
+                        self.char_terms.setdefault(char, []).append(gram)
+                posting.append(entry)
+            self.num_entries += len(grams)
+
+    def add_many(self, contents: list[tuple[str, list[str]]]) -> None:
+        for content_id, texts in contents:
+            self.add(content_id, texts)
+
+    def remove(self, content_id: str) -> None:
+        # the entries stay until the next rebuild
+        document = self.documents.pop(content_id, None)
+        if document is not None:
+            self.removed.add(document)
+
+    def _entries(self, word: str) -> Optional[np.ndarray]:
+        # the entries of the fields the word is found in. Views on the arrays
+        # are used, which are not resized while they exist since the search
+        # does not yield to the event loop
+        if len(word) == 1:
+            # a single character is found in every term it is part of
+            grams = self.char_terms.get(word)
+            if not grams:
+                return None
+            # the entries are marked instead of merged, which would need a sort
+            found = np.zeros(len(self.content_ids) << FIELD_BITS, dtype=bool)
+            for gram in grams:
+                found[np.frombuffer(self.terms[gram], dtype=np.uint32)] = True
+            return np.flatnonzero(found)
+
+        postings = [self.terms.get(gram) for gram in bigrams(word)]
+        if any(posting is None for posting in postings):
+            return None
+        return _intersect(
+            [np.frombuffer(posting, dtype=np.uint32) for posting in postings]
+        ).astype(np.int64)
+
+    def search(self, words: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        # every word has to be found within a single field; the score of a
+        # document is the weight of the fields its words were found in.
+        # Returns the matching documents in ascending order and their scores
+        documents = scores = np.empty(0, dtype=np.int64)
+        for i, word in enumerate(words):
+            entries = self._entries(word)
+            if entries is None:
+                return documents, scores
+            # entries are sorted by document, so the fields of a document are
+            # next to each other
+            term_documents = entries >> FIELD_BITS
+            starts = np.flatnonzero(np.diff(term_documents, prepend=-1).astype(bool))
+            term_documents = term_documents[starts]
+            term_scores = (
+                np.add.reduceat(
+                    _FIELD_WEIGHTS[entries & ((1 << FIELD_BITS) - 1)], starts
+                )
+                if len(entries)
+                else np.empty(0, dtype=np.int64)
+            )
+            if i == 0:
+                documents, scores = term_documents, term_scores
+            else:
+                positions = np.searchsorted(term_documents, documents)
+                positions[positions == len(term_documents)] = 0
+                found = term_documents[positions] == documents
+                documents = documents[found]
+                scores = scores[found] + term_scores[positions[found]]
+            if not len(documents):
+                return documents, scores
+        if self.removed:
+            kept = ~np.isin(documents, self._removed_array())
+            documents, scores = documents[kept], scores[kept]
+        return documents, scores
+
+    def _removed_array(self) -> np.ndarray:
+        if self._removed_cache is None or len(self._removed_cache) != len(self.removed):
+            self._removed_cache = np.fromiter(
+                self.removed, dtype=np.int64, count=len(self.removed)
+            )
+        return self._removed_cache
+
+
+class SearchIndex(RebuiltIndex[_Postings]):
+    name = "search"
+
+    def __init__(self) -> None:
+        super().__init__(_Postings())
+        self.queries = 0
+
+    async def _load(self) -> _Postings:
+        postings = _Postings()
+        after_id = None
+        while True:
+            async with get_db_session() as session:
+                contents = await get_content_texts(
+                    session, REBUILD_BATCH_SIZE, after_id
+                )
+            if not contents:
+                return postings
+            # tokenizing is CPU bound, so it does not run on the event loop
+            await asyncio.to_thread(postings.add_many, contents)
+            after_id = contents[-1][0]
+
+    def _rebuild_interval(self) -> float:
+        return settings.search_rebuild_interval
+
+    def add_content(self, content: Content) -> None:
+        texts = [content.who, content.what, content.detail] + [
+            paraphrase.content for paraphrase in content.paraphrases
+        ]
+        self._change(lambda postings: postings.add(content.content_id, texts))
+
+    def remove_contents(self, content_ids: list[str]) -> None:
+        def remove(postings: _Postings) -> None:
+            for content_id in content_ids:
+                postings.remove(content_id)
+
+        self._change(remove)
+
+    def search(self, query: str, offset: int, limit: int) -> tuple[list[str], int]:
+        # returns a page of content ids, best match first and newer first
+        # among equal scores, and the number of matches
+        words = [
+            word for word in _WORD.findall(normalize(query)) if is_searchable(word)
+        ]
+        if not words:
+            raise ValidationError(detail="Query is too short")
+        self.queries += 1
+        documents, scores = self._data.search(words)
+        # best score first and the newest document among equal scores
+        keys = scores << 32 | documents
+        end = offset + limit
+        if end < len(keys):
+            keys = keys[np.argpartition(-keys, end)[:end]]
+        page = np.sort(keys)[::-1][offset:end] & 0xFFFFFFFF
+        content_ids = self._data.content_ids
+        return [content_ids[document] for document in page.tolist()], len(documents)
+
+    def stats(self) -> dict[str, Any]:
+        postings = self._data
+        return {
+            "contents": len(postings.documents),
+            "terms": len(postings.terms),
+            # 4 bytes each
+            "entries": postings.num_entries,
+            "queries": self.queries,
+            "rebuilds": self.rebuilds,
+            "last_rebuild_seconds": self.last_rebuild_seconds,
+        }
+
+
+search_index = SearchIndex()
+
+
+async def search_contents(
+    session: AsyncSession, query: str, page: int = 1, per_page: int = 10
+) -> tuple[list[ContentRow], int]:
+    if len(query) > settings.max_search_query_length:
+        raise ValidationError(
+            detail=f"The query can be at most {settings.max_search_query_length} "
+            "characters"
+        )
+    await search_index.ensure_ready()
+    content_ids, total = search_index.search(
+        query, (max(page, 1) - 1) * per_page, per_page
+    )
+    return await get_contents_by_ids(session, content_ids), total
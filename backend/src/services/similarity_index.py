@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import zlib
+from time import perf_counter
+from typing import Any, Optional
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.db_settings import get_db_session
+from core.metrics import record_similarity_lookup
+from models.custom_types.content import Content
+from models.requests.iikae_request import IikaeRequest
+from repositories.content import get_contents_by_ids
+from repositories.input import get_input_texts
+from services.generation_cache import normalize_text
+from services.rebuilt_index import RebuiltIndex
+
+logger = logging.getLogger("uvicorn")
+
+NGRAM_SIZES = (2, 3)
+REBUILD_BATCH_SIZE = 5000
+INITIAL_CAPACITY = 1024
+# the most similar past requests that are looked at for one to the same person
+SIMILAR_CANDIDATES = 5
+
+
+def vectorize(who: str, what: str, detail: str, dimensions: int) -> np.ndarray:
+    # hashed character n-grams of each field, tagged with the field so that the
+    # same words in "who" and in "detail" do not match, with a hashed sign so
+    # that collisions cancel out on average; unit length, so that the dot
+    # product of two vectors is their cosine similarity
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for field, text in enumerate((who, what, detail)):
+        text = normalize_text(text).replace(" ", "")
+        for size in NGRAM_SIZES:
+            for i in range(max(len(text) - size + 1, 1)):
+                hashed = zlib.crc32(f"{field}{text[i : i + size]}".encode("utf-8"))
+                vector[hashed % dimensions] += 1.0 if hashed >> 31 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+def vectorize_request(iikae_request: IikaeRequest) -> np.ndarray:
+    return vectorize(
+        iikae_request.who,
+        iikae_request.what,
+        iikae_request.detail,
+        settings.similarity_dimensions,
+    )
+
+
+class _Vectors:
+    # one row per input; rows are appended to a matrix that grows by doubling
+    # and removed rows are zeroed, so they never match
+    def __init__(self, dimensions: int) -> None:
+        self.dimensions = dimensions
+        self.matrix = np.zeros((INITIAL_CAPACITY, dimensions), dtype=np.float32)
+        self.size = 0
+        self.content_ids: list[str] = []
+        self.rows: dict[str, int] = {}
+
+    def add(self, content_id: str, vector: np.ndarray) -> None:
+        if content_id in self.rows:
+            return
+        if self.size == len(self.matrix):
+            # lookups running in a thread keep the old matrix
+            matrix = np.zeros((self.size * 2, self.dimensions), dtype=np.float32)
+            matrix[: self.size] = self.matrix
+            self.matrix = matrix
+        self.matrix[self.size] = vector
+        self.rows[content_id] = self.size
+        self.content_ids.append(content_id)
+        self.size += 1
+
+    def add_many(self, inputs: list[tuple[str, str, str, str]]) -> None:
+        for content_id, who, what, detail in inputs:
+            self.add(content_id, vectorize(who, what, detail, self.dimensions))
+
+    def remove(self, content_id: str) -> None:
+        row = self.rows.pop(content_id, None)
+        if row is not None:
+            self.matrix[row] = 0
+
+    def search(self, queries: np.ndarray, k: int) -> list[list[tuple[str, float]]]:
+        # the k most similar inputs for each row of queries, best first
+        if not self.size:
+            return [[] for _ in queries]
+        scores = queries @ self.matrix[: self.size].T
+        k = min(k, self.size)
+        if k == 1:
+            top = scores.argmax(axis=1)[:, None]
+        else:
+            top = np.argpartition(scores, self.size - k, axis=1)[:, -k:]
+        results = []
+        for query_scores, rows in zip(scores, top):
+            rows = rows[np.argsort(-query_scores[rows])]
+            results.append(
+                [
+                    (self.content_ids[row], float(query_scores[row]))
+                    for row in rows.tolist()
+                ]
+            )
+        return results
+
+
+class SimilarityIndex(RebuiltIndex[_Vectors]):
+    name = "similarity"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.lookups = 0
+        self.batches = 0
+        self._build_task: Optional[asyncio.Task] = None
+        self._pending: list[tuple[np.ndarray, asyncio.Future, int]] = []
+
+    async def _load(self) -> _Vectors:
+        vectors = _Vectors(settings.similarity_dimensions)
+        after_id = None
+        while True:
+            async with get_db_session() as session:
+                inputs = await get_input_texts(session, REBUILD_BATCH_SIZE, after_id)
+            if not inputs:
+                return vectors
+            await asyncio.to_thread(vectors.add_many, inputs)
+            after_id = inputs[-1][0]
+
+    def _rebuild_interval(self) -> float:
+        return settings.similarity_rebuild_interval
+
+    async def _build(self) -> None:
+        try:
+            await self.ensure_ready()
+        except Exception:
+            logger.exception("Failed to build the similarity index")
+
+    def add_content(self, content: Content) -> None:
+        vector = vectorize(
+            content.who, content.what, content.detail, settings.similarity_dimensions
+        )
+        self._change(lambda vectors: vectors.add(content.content_id, vector))
+
+    def remove_contents(self, content_ids: list[str]) -> None:
+        def remove(vectors: _Vectors) -> None:
+            for content_id in content_ids:
+                vectors.remove(content_id)
+
+        self._change(remove)
+
+    async def search(self, vector: np.ndarray, k: int = 1) -> list[tuple[str, float]]:
+        # lookups that arrive in the same iteration of the event loop are
+        # answered with a single matrix product
+        if not self._ready:
+            # requests are not held up by the build, they are just not
+            # answered from similar ones until it is done
+            if self._build_task is None or self._build_task.done():
+                self._build_task = asyncio.create_task(self._build())
+            return []
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((vector, future, k))
+        if len(self._pending) == 1:
+            asyncio.get_running_loop().call_soon(
+                lambda: asyncio.ensure_future(self._flush())
+            )
+        return await future
+
+    async def _flush(self) -> None:
+        pending, self._pending = self._pending, []
+        queries = np.stack([vector for vector, _, _ in pending])
+        k = max(k for _, _, k in pending)
+        self.lookups += len(pending)
+        self.batches += 1
+        try:
+            # the matrix product releases the GIL
+            results = await asyncio.to_thread(self._data.search, queries, k)
+        except Exception as e:
+            for _, future, _ in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, k), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result[:k])
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "size": self._data.size if self._data is not None else 0,
+            "lookups": self.lookups,
+            "batches": self.batches,
+            "rebuilds": self.rebuilds,
+            "last_rebuild_seconds": self.last_rebuild_seconds,
+        }
+
+
+similarity_index = SimilarityIndex()
+
+
+async def find_similar_content(
+    session: AsyncSession, iikae_request: IikaeRequest
+) -> Content | None:
+    # the content of the most similar past request, if it is similar enough
+    # for its paraphrases to be reused
+    if settings.similarity_threshold > 1:
+        return None
+    started_at = perf_counter()
+    matches = await similarity_index.search(
+        vectorize_request(iikae_request), SIMILAR_CANDIDATES
+    )
+    record_similarity_lookup(perf_counter() - started_at)
+    content_ids = [
+        content_id
+        for content_id, score in matches
+        if score >= settings.similarity_threshold
+    ]
+    if not content_ids:
+        return None
+
+    # "who" differs by a character between 上司 and 部下 or 母 and 父, so only
+    # requests to the same person are close enough
+    who = normalize_text(iikae_request.who)
+    contents = {
+        content.content_id: content
+        for content in await get_contents_by_ids(session, content_ids)
+        if normalize_text(content.who) == who
+    }
+    for content_id in content_ids:
+        if content_id in contents:
+            return contents[content_id].to_content()
+    return None
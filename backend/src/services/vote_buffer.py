@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Callable
+
+from core.config import settings
+from core.db_settings import get_db_session
+from repositories.paraphrase import add_vote_counts
+
+logger = logging.getLogger("uvicorn")
+
+
+class VoteBuffer:
+    def __init__(
+        self,
+        flush_interval: float | None = None,
+        flush_threshold: int | None = None,
+    ) -> None:
+        # None means the value is read from the settings once the buffer runs,
+        # so that creating the buffer at import does not load the settings
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.flushes = 0
+        self.flushed_votes = 0
+        self.failed_flushes = 0
+        self._pending: dict[str, int] = {}
+        self._num_pending = 0
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self._listeners: list[Callable[[dict[str, int], dict[str, int]], None]] = []
+
+    def add_listener(
+        self, listener: Callable[[dict[str, int], dict[str, int]], None]
+    ) -> None:
+        # listeners get the flushed vote counts per paraphrase and per input
+        self._listeners.append(listener)
+
+    def add(self, paraphrase_id: str, count: int = 1) -> None:
+        self._pending[paraphrase_id] = self._pending.get(paraphrase_id, 0) + count
+        self._num_pending += count
+        if (
+            self.flush_threshold is not None
+            and self._num_pending >= self.flush_threshold
+            and self._wakeup is not None
+        ):
+            self._wakeup.set()
+
+    def start(self) -> None:
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._stopping = True
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        # drain whatever arrived while the last flush was running
+        await self.flush()
+
+    async def _run(self) -> None:
+        if self.flush_interval is None:
+            self.flush_interval = settings.vote_flush_interval
+        if self.flush_threshold is None:
+            self.flush_threshold = settings.vote_flush_threshold
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+
+        vote_counts, self._pending = self._pending, {}
+        num_votes, self._num_pending = self._num_pending, 0
+        try:
+            async with get_db_session() as session:
+                input_vote_counts = await add_vote_counts(session, vote_counts)
+        except Exception:
+            logger.exception("Failed to flush %d votes", num_votes)
+            self.failed_flushes += 1
+            for paraphrase_id, count in vote_counts.items():
+                self.add(paraphrase_id, count)
+            return
+
+        self.flushes += 1
+        self.flushed_votes += num_votes
+        for listener in self._listeners:
+            listener(vote_counts, input_vote_counts)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "pending": self._num_pending,
+            "flushes": self.flushes,
+            "flushed_votes": self.flushed_votes,
+            "failed_flushes": self.failed_flushes,
+        }
+
+
+vote_buffer = VoteBuffer()
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+import math
+import time
+from typing import Any
+
+from fastapi import Request
+
+from core.config import settings
+from services.admission import client_key
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        # the optimal number of bits and hashes for capacity entries at the
+        # given false positive rate
+        self.capacity = capacity
+        self.num_bits = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key: bytes) -> list[int]:
+        # double hashing: two 64-bit halves of one digest give all positions
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, key: bytes) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+    def add(self, key: bytes) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def error_rate(self) -> float:
+        # expected false positive rate at the current fill
+        return (
+            1 - math.exp(-self.num_hashes * self.count / self.num_bits)
+        ) ** self.num_hashes
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self._bits)
+
+
+class RotatingBloomFilter:
+    # a key is remembered for at least one window and at most two: it is added
+    # to the current filter and looked up in both, and every window, or once
+    # the current filter is full, the previous one is dropped; lookups go to
+    # both filters, so each gets half of the error rate
+    def __init__(self, window: float, capacity: int, error_rate: float) -> None:
+        self.window = window
+        self.capacity = capacity
+        self.error_rate = error_rate / 2
+        self.rotations = 0
+        self._current = BloomFilter(capacity, self.error_rate)
+        self._previous = BloomFilter(capacity, self.error_rate)
+        self._rotated_at = time.monotonic()
+
+    def _rotate_if_needed(self) -> None:
+        now = time.monotonic()
+        if now - self._rotated_at < self.window and self._current.count < self.capacity:
+            return
+        self._previous = self._current
+        self._current = BloomFilter(self.capacity, self.error_rate)
+        self._rotated_at = now
+        self.rotations += 1
+
+    def add_if_missing(self, key: bytes) -> bool:
+        # returns False if the key was (probably) seen already
+        self._rotate_if_needed()
+        if key in self._current or key in self._previous:
+            return False
+        self._current.add(key)
+        return True
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "memory_bytes": self._current.memory_bytes + self._previous.memory_bytes,
+            "num_hashes": self._current.num_hashes,
+            "current_count": self._current.count,
+            "previous_count": self._previous.count,
+            "error_rate": self._current.error_rate() + self._previous.error_rate(),
+            "rotations": self.rotations,
+        }
+
+
+class VoteDeduplicator:
+    def __init__(self) -> None:
+        self.accepted = 0
+        self.rejected = 0
+
+    @functools.cached_property
+    def _seen(self) -> RotatingBloomFilter:
+        return RotatingBloomFilter(
+            settings.vote_dedupe_window,
+            settings.vote_dedupe_capacity,
+            settings.vote_dedupe_error_rate,
+        )
+
+    def admit(self, request: Request, paraphrase_id: str) -> bool:
+        # keyed on the address the trusted proxies saw, since any header the
+        # client sends, like its user agent, can change with every vote
+        key = f"{client_key(request)}\0{paraphrase_id}".encode("utf-8")
+        if self._seen.add_if_missing(key):
+            self.accepted += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def stats(self) -> dict[str, Any]:
+        total = self.accepted + self.rejected
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "rejected_ratio": self.rejected / total if total else 0.0,
+            "filter": self._seen.stats(),
+        }
+
+
+vote_deduplicator = VoteDeduplicator()
@@ -0,0 +1,78 @@
+import json
+import os
+import tempfile
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+# the settings and the engine are created from the environment on first use
+os.environ.update(
+    {
+        "ENV_NAME": "local",
+        "DB_NAME": "iikaesankai",
+        "DB_PASSWORD": "test",
+        "DB_PORT": "3306",
+        "DB_USERNAME": "test",
+        "DATABASE_URL": "sqlite+aiosqlite:///"
+        + os.path.join(tempfile.mkdtemp(), "test.db"),
+        "OPENAI_API_KEY": "sk-test",
+        "FRONTEND_URL": "http://localhost:3000",
+        "IS_TEST": "false",
+        "CLIENT_GENERATION_BURST": "1000000",
+    }
+)
+
+
+class FakeCompletions:
+    # every completion has three paraphrases that tell their position
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def create(self, stream: bool = False, **kwargs: Any) -> Any:
+        self.calls += 1
+        message = SimpleNamespace(
+            content=json.dumps(
+                {
+                    "paraphrases": [
+                        f"1つ目の回答 {self.calls}",
+                        f"2つ目の回答 {self.calls}",
+                        f"関西弁の回答 {self.calls}",
+                    ]
+                },
+                ensure_ascii=False,
+            )
+        )
+        choice = SimpleNamespace(message=message, delta=message)
+        completion = SimpleNamespace(choices=[choice])
+        if stream:
+
+            async def chunks():
+                yield completion
+
+            return chunks()
+        return completion
+
+
+@pytest.fixture(scope="session")
+def client():
+    import asyncio
+
+    from fastapi.testclient import TestClient
+    from sqlmodel import SQLModel
+
+    import models.sqlmodels  # noqa: F401
+    import services.generation
+    from core.db_settings import get_engine
+    from main import app
+
+    async def create_tables():
+        async with get_engine().begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+
+    asyncio.run(create_tables())
+    services.generation.client = SimpleNamespace(
+        chat=SimpleNamespace(completions=FakeCompletions())
+    )
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,122 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from core.config import get_settings
+from core.exceptions import ServiceUnavailableError, TooManyRequestsError
+from services import admission
+from services.admission import AdaptiveLimiter, ClientRateLimiter, client_key
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "min_concurrent_generations", 2)
+    monkeypatch.setattr(settings, "max_concurrent_generations", 4)
+    monkeypatch.setattr(settings, "generation_queue_size", 1)
+    monkeypatch.setattr(settings, "generation_queue_timeout", 0.05)
+    monkeypatch.setattr(settings, "generation_latency_target", 0.05)
+    return settings
+
+
+async def hold(limiter, seconds, results):
+    try:
+        async with limiter.acquire():
+            await asyncio.sleep(seconds)
+        results.append("done")
+    except ServiceUnavailableError:
+        results.append("shed")
+
+
+def test_requests_over_the_limit_queue_and_are_then_shed(limits):
+    async def run():
+        limiter = AdaptiveLimiter()
+        results = []
+        # four in flight, one queued, the sixth shed at once
+        await asyncio.gather(*(hold(limiter, 0.01, results) for _ in range(6)))
+        return limiter, results
+
+    limiter, results = asyncio.run(run())
+    assert results.count("shed") == 1
+    assert results.count("done") == 5
+    assert limiter.in_flight == 0
+
+
+def test_slow_completions_shrink_the_limit(limits):
+    async def run():
+        limiter = AdaptiveLimiter()
+        results = []
+        await asyncio.gather(*(hold(limiter, 0.1, results) for _ in range(4)))
+        return limiter
+
+    limiter = asyncio.run(run())
+    # completions that started before the decrease do not shrink it again
+    assert limiter.limit == 3.0
+    assert limiter.decreases == 1
+
+
+def test_timeouts_shrink_the_limit_down_to_the_minimum(limits):
+    async def run():
+        limiter = AdaptiveLimiter()
+        for _ in range(5):
+            with pytest.raises(admission.HTTPException):
+                async with limiter.acquire():
+                    raise admission.HTTPException(status_code=504)
+        return limiter
+
+    limiter = asyncio.run(run())
+    assert limiter.limit == 2.0
+
+
+def test_on_time_completions_at_the_limit_grow_it(limits):
+    async def run():
+        limiter = AdaptiveLimiter()
+        limiter.limit = 2.0
+        results = []
+        for _ in range(4):
+            await asyncio.gather(*(hold(limiter, 0, results) for _ in range(2)))
+        return limiter
+
+    limiter = asyncio.run(run())
+    assert 2.0 < limiter.limit <= 4.0
+    assert limiter.increases > 0
+
+
+def test_clients_get_a_burst_and_then_a_rate(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "client_generation_burst", 2)
+    monkeypatch.setattr(settings, "client_generation_rate", 0.5)
+    now = [1000.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: now[0])
+    limiter = ClientRateLimiter()
+    limiter.admit("a")
+    limiter.admit("a")
+    with pytest.raises(TooManyRequestsError) as error:
+        limiter.admit("a")
+    assert error.value.headers["Retry-After"] == "2"
+    limiter.admit("b")
+    now[0] += 2
+    limiter.admit("a")
+
+
+@pytest.mark.parametrize(
+    "forwarded_for, depth, expected",
+    [
+        (["1.1.1.1"], 1, "1.1.1.1"),
+        (["9.9.9.9, 1.1.1.1"], 1, "1.1.1.1"),
+        (["9.9.9.9", "1.1.1.1, 2.2.2.2"], 2, "1.1.1.1"),
+        (["1.1.1.1"], 3, "1.1.1.1"),
+        (["1.1.1.1"], 0, "10.0.0.1"),
+        ([], 1, "10.0.0.1"),
+    ],
+)
+def test_client_key_trusts_only_the_proxies(
+    monkeypatch, forwarded_for, depth, expected
+):
+    monkeypatch.setattr(get_settings(), "trusted_proxy_depth", depth)
+    request = SimpleNamespace(
+        headers=SimpleNamespace(getlist=lambda name: forwarded_for),
+        client=SimpleNamespace(host="10.0.0.1"),
+    )
+    assert client_key(request) == expected
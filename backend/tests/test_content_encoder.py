@@ -0,0 +1,96 @@
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from models.custom_types.content import ContentRow, ParaphraseRow
+from models.responses.get_contents_batch_response import GetContentsBatchResponse
+from models.responses.get_contents_response import GetContentsResponse
+from models.responses.search_contents_response import SearchContentsResponse
+from services.content_encoder import (
+    encode_content,
+    encode_contents_batch_response,
+    encode_contents_response,
+    encode_search_response,
+)
+
+TEXTS = [
+    "上司",
+    'カツラ"ずれて"ますよ',
+    "改行\nと\tタブと\r復帰",
+    "バックスラッシュ\\と/スラッシュ",
+    "制御文字\x00\x1f\x7f",
+    "絵文字😀と 行区切り ",
+    "",
+]
+
+
+def content_row(content_id, num_paraphrases, text=""):
+    return ContentRow(
+        content_id,
+        f"{text}who",
+        f"what{text}",
+        text,
+        [
+            ParaphraseRow(f"{content_id}-{i}", f"{text}{i}", i * 7)
+            for i in range(num_paraphrases)
+        ],
+    )
+
+
+def fastapi_body(model):
+    # what FastAPI sends for a response_model
+    return JSONResponse(jsonable_encoder(model)).body
+
+
+CONTENTS = [
+    [],
+    [content_row("no paraphrases", 0)],
+    [content_row(f"id{i}", 3, text) for i, text in enumerate(TEXTS)],
+    [content_row("one", 1, TEXTS[1]), content_row("four", 4, TEXTS[2])],
+]
+
+
+@pytest.mark.parametrize("contents", CONTENTS)
+def test_encode_content(contents):
+    for content in contents:
+        assert encode_content(content) == fastapi_body(content.to_content())
+
+
+@pytest.mark.parametrize("contents", CONTENTS)
+@pytest.mark.parametrize("next_cursor", [None, "eyJhIjoxfQ"])
+def test_encode_contents_response(contents, next_cursor):
+    response = GetContentsResponse(
+        contents=[content.to_content() for content in contents],
+        next_cursor=next_cursor,
+    )
+    assert encode_contents_response(contents, next_cursor) == fastapi_body(response)
+
+
+@pytest.mark.parametrize("contents", CONTENTS)
+@pytest.mark.parametrize("missing_ids", [[], ["missing", '"quoted"']])
+def test_encode_contents_batch_response(contents, missing_ids):
+    response = GetContentsBatchResponse(
+        contents=[content.to_content() for content in contents],
+        missing_ids=missing_ids,
+    )
+    assert encode_contents_batch_response(contents, missing_ids) == fastapi_body(
+        response
+    )
+
+
+@pytest.mark.parametrize("contents", CONTENTS)
+def test_encode_search_response(contents):
+    response = SearchContentsResponse(
+        contents=[content.to_content() for content in contents], total=123
+    )
+    assert encode_search_response(contents, 123) == fastapi_body(response)
+
+
+def test_cached_fragments_follow_the_vote_counts():
+    content = content_row("cached", 3, TEXTS[1])
+    encode_content(content)
+    content.paraphrases[1].vote_count = 1000
+    assert encode_content(content) == fastapi_body(content.to_content())
+    # a content read again with fewer paraphrases is not encoded from the cache
+    content.paraphrases.pop()
+    assert encode_content(content) == fastapi_body(content.to_content())
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+from sqlalchemy import update
+
+from core.db_settings import get_db_session
+from models.sqlmodels.input import Input
+
+
+def post_iikae(client, detail):
+    response = client.post(
+        "/iikae/", json={"who": "上司", "what": "締め切り", "detail": detail}
+    )
+    assert response.status_code == 200
+    return response.json()["content"]
+
+
+def test_paraphrases_are_read_in_generation_order(client):
+    for i in range(20):
+        content = post_iikae(client, f"順番の確認 {i}")
+        posted = [paraphrase["content"] for paraphrase in content["paraphrases"]]
+        assert posted[2].startswith("関西弁")
+
+        response = client.get(f"/contents/{content['content_id']}/")
+        assert response.status_code == 200
+        assert [
+            paraphrase["content"] for paraphrase in response.json()["paraphrases"]
+        ] == posted
+
+
+def test_soft_deleted_contents_are_hidden(client):
+    deleted_id = post_iikae(client, "削除の確認")["content_id"]
+    kept_id = post_iikae(client, "残す")["content_id"]
+
+    # contents are soft-deleted by setting deleted_at on their input only
+    async def soft_delete():
+        async with get_db_session() as session:
+            await session.execute(
+                update(Input)
+                .where(Input.id == deleted_id)
+                .values(deleted_at=datetime.utcnow())
+            )
+            await session.commit()
+
+    client.portal.call(soft_delete)
+
+    assert client.get(f"/contents/{deleted_id}/").status_code == 404
+    assert client.get(f"/contents/{kept_id}/").status_code == 200
+    response = client.get(f"/contents/batch/?ids={deleted_id},{kept_id}")
+    assert response.json()["missing_ids"] == [deleted_id]
+    # a page size of its own, so that the page is not cached yet
+    response = client.get("/contents/?per_page=37")
+    content_ids = [content["content_id"] for content in response.json()["contents"]]
+    assert kept_id in content_ids
+    assert deleted_id not in content_ids
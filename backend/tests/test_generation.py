@@ -0,0 +1,7 @@
+from services import generation
+
+
+def test_the_client_does_not_retry_on_its_own(monkeypatch):
+    monkeypatch.setattr(generation, "client", None)
+    client = generation._get_client()
+    assert client.max_retries == 0
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from core.config import get_settings
+from models.sqlmodels.generation_job import GenerationJob
+from services.job_queue import GenerationJobQueue
+
+
+class RecordingQueue(GenerationJobQueue):
+    # records how jobs end instead of writing them to the database
+    def __init__(self, handler) -> None:
+        super().__init__()
+        self.set_handler(handler)
+        self.ended: list[tuple] = []
+
+    async def _finish(self, id, status, content_id=None, error=None) -> None:
+        self.ended.append((status.value, content_id, error))
+
+    async def _requeue(self, id) -> None:
+        self.ended.append(("requeued", None, None))
+
+
+def run_job(handler, attempts=1):
+    queue = RecordingQueue(handler)
+    job = GenerationJob(who="上司", what="締め切り", detail="延ばしたい")
+    job.attempts = attempts
+    asyncio.run(queue._run_job(job))
+    return queue.ended
+
+
+def test_succeeded():
+    async def handler(job):
+        return "content_id"
+
+    assert run_job(handler) == [("succeeded", "content_id", None)]
+
+
+def test_slow_jobs_are_given_up_before_they_go_stale(monkeypatch):
+    monkeypatch.setattr(get_settings(), "generation_job_timeout", 0.2)
+
+    async def handler(job):
+        await asyncio.sleep(1)
+        return "content_id"
+
+    assert run_job(handler) == [("requeued", None, None)]
+    assert run_job(handler, attempts=3) == [("failed", None, "Generation timed out")]
+
+
+@pytest.mark.parametrize(
+    "status_code, ended",
+    [
+        (400, ("failed", None, "Invalid input")),
+        (422, ("failed", None, "Invalid input")),
+        (500, ("requeued", None, None)),
+        (504, ("requeued", None, None)),
+    ],
+)
+def test_only_client_errors_are_terminal(status_code, ended):
+    async def handler(job):
+        raise HTTPException(status_code=status_code, detail="Invalid input")
+
+    assert run_job(handler) == [ended]
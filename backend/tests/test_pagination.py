@@ -0,0 +1,44 @@
+import pytest
+from test_contents import post_iikae
+
+from core.constants import MAX_PER_PAGE
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "page=0",
+        "page=-1",
+        "per_page=0",
+        "per_page=-5",
+        f"per_page={MAX_PER_PAGE + 1}",
+        "cursor=invalid",
+    ],
+)
+@pytest.mark.parametrize("order_by", ["latest", "ranking", "hot"])
+def test_invalid_pages_are_rejected(client, order_by, query):
+    response = client.get(f"/contents/?order_by={order_by}&{query}")
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("order_by", ["latest", "ranking", "hot"])
+def test_cursors_walk_every_content_once(client, order_by):
+    for i in range(5):
+        post_iikae(client, f"ページの確認 {order_by} {i}")
+
+    response = client.get(f"/contents/?order_by={order_by}&per_page={MAX_PER_PAGE}")
+    expected = [content["content_id"] for content in response.json()["contents"]]
+    assert len(expected) >= 5
+
+    content_ids = []
+    cursor = None
+    while True:
+        query = f"order_by={order_by}&per_page=2"
+        if cursor is not None:
+            query += f"&cursor={cursor}"
+        page = client.get(f"/contents/?{query}").json()
+        content_ids += [content["content_id"] for content in page["contents"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert content_ids == expected
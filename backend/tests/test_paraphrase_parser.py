@@ -0,0 +1,110 @@
+import pytest
+
+from services.paraphrase_parser import (
+    INVALID_INPUT_MESSAGE,
+    ParaphraseStreamParser,
+    ParseResult,
+    parse_paraphrases,
+)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"paraphrases": ["a", "b", "c"]}', ParseResult(["a", "b", "c"])),
+        (
+            '{"paraphrases": ["今日の風、\nやんちゃ", "b", "c"]}',
+            ParseResult(["今日の風、\nやんちゃ", "b", "c"]),
+        ),
+        ('{"paraphrases": [" a ", "b", "c"]}', ParseResult(["a", "b", "c"])),
+        ('{"invalid": true}', ParseResult([], invalid=True)),
+    ],
+)
+def test_parse_json(text, expected):
+    assert parse_paraphrases(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('```json\n{"paraphrases": ["a", "b", "c"]}\n```', ["a", "b", "c"]),
+        ('はい！\n{"paraphrases": ["a", "b", "c"]}\n以上です。', ["a", "b", "c"]),
+        ('{"paraphrases": ["a", "b", "c",],}', ["a", "b", "c"]),
+        ('["a", "b", "c"]', ["a", "b", "c"]),
+        ('{"answers": ["a", "b", "c"]}', ["a", "b", "c"]),
+        ('{"paraphrases": ["a", "b", "c", "d"]}', ["a", "b", "c"]),
+        ('{"paraphrases": ["a", "", "b", "c"]}', ["a", "b", "c"]),
+        ('{"paraphrases": ["a", "b", "c', ["a", "b"]),
+        ('{"paraphrases": ["a", 1, "c"]}', ["a"]),
+        ("---\nいち\n\nに\n\nさん\n---", ["いち", "に", "さん"]),
+        ("1. いち\n\n2. に\n\n3. さん", ["いち", "に", "さん"]),
+    ],
+)
+def test_parse_near_misses(text, expected):
+    assert parse_paraphrases(text) == ParseResult(expected, repaired=True)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        '{"paraphrases": "a\n\nb\n\nc"}',
+        '[{"a": 1}\n\n{"b": 2}\n\n{"c": 3}]',
+        "```json\n{paraphrases: a\n\nb\n\nc}\n```",
+    ],
+)
+def test_parse_json_debris(text):
+    assert parse_paraphrases(text) == ParseResult([], repaired=True)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        'これは無理です {"invalid": true',
+        INVALID_INPUT_MESSAGE,
+        f'{{"paraphrases": ["{INVALID_INPUT_MESSAGE}", "b", "c"]}}',
+    ],
+)
+def test_parse_invalid(text):
+    assert parse_paraphrases(text).invalid
+
+
+def feed(parser, text, size):
+    texts = []
+    for i in range(0, len(text), size):
+        texts.extend(parser.feed(text[i : i + size]))
+    return texts
+
+
+@pytest.mark.parametrize("size", [1, 3, 1000])
+def test_stream(size):
+    parser = ParaphraseStreamParser()
+    text = '{"paraphrases": ["今日の\\"風\\"", "改行\nあり", "c"]}'
+    assert feed(parser, text, size) == ['今日の"風"', "改行\nあり", "c"]
+    assert parser.close() == ParseResult([])
+    assert not parser.invalid
+
+
+def test_stream_yields_each_string_as_it_completes():
+    parser = ParaphraseStreamParser()
+    assert parser.feed('{"paraphrases": ["a", "b') == ["a"]
+    assert parser.feed('", "c"') == ["b", "c"]
+    assert parser.feed("]}") == []
+
+
+def test_stream_invalid():
+    parser = ParaphraseStreamParser()
+    assert feed(parser, '{"invalid": true}', 2) == []
+    assert parser.invalid
+    assert parser.close().invalid
+
+
+def test_stream_repairs_the_rest_on_close():
+    parser = ParaphraseStreamParser()
+    assert feed(parser, "---\nいち\n\nに\n\nさん\n---", 3) == []
+    assert parser.close() == ParseResult(["いち", "に", "さん"], repaired=True)
+
+
+def test_stream_truncated():
+    parser = ParaphraseStreamParser()
+    assert feed(parser, '{"paraphrases": ["a", "b", "c', 4) == ["a", "b"]
+    assert parser.close() == ParseResult([], repaired=True)
@@ -0,0 +1,39 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from services import ranking_index
+from services.ranking_index import RankingIndex, ScoreIndex
+
+
+def test_score_index_pages_highest_and_newest_first():
+    index = ScoreIndex()
+    index.rebuild({"a": 1.0, "b": 3.0, "c": 1.0})
+    index.set_score("d", 2.0)
+    assert index.page(0, 2) == [(3.0, "b"), (2.0, "d")]
+    assert index.page_after(2.0, "d", 10) == [(1.0, "c"), (1.0, "a")]
+    index.remove("b")
+    assert index.page(0, 10) == [(2.0, "d"), (1.0, "c"), (1.0, "a")]
+
+
+def test_changes_during_a_rebuild_are_replayed(monkeypatch):
+    index = RankingIndex()
+    now = datetime.utcnow()
+
+    @asynccontextmanager
+    async def get_db_session():
+        yield None
+
+    async def get_vote_counts(session):
+        # a content is posted, one archived and votes flushed while the table
+        # is read
+        index.add_content("new", now)
+        index.remove_contents(["archived"])
+        index.apply_vote_counts({}, {"old": 2, "new": 1})
+        return [("old", 3, now), ("archived", 9, now)]
+
+    monkeypatch.setattr(ranking_index, "get_db_session", get_db_session)
+    monkeypatch.setattr(ranking_index, "get_vote_counts", get_vote_counts)
+    asyncio.run(index.rebuild())
+    assert index.ranking.page(0, 10) == [(5, "old"), (1, "new")]
+    assert [content_id for _, content_id in index.hot.page(0, 10)] == ["old", "new"]
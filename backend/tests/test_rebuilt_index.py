@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from services.rebuilt_index import RebuiltIndex
+
+
+class ListIndex(RebuiltIndex[list]):
+    def __init__(self, rows, during_load=None) -> None:
+        super().__init__()
+        self.rows = rows
+        self.during_load = during_load
+
+    async def _load(self) -> list:
+        rows = list(self.rows)
+        if self.during_load is not None:
+            self.during_load()
+        await asyncio.sleep(0)
+        return rows
+
+    def add(self, row) -> None:
+        self._change(lambda rows: rows.append(row))
+
+
+def test_changes_during_a_rebuild_are_replayed():
+    index = ListIndex(["a"])
+    index.during_load = lambda: index.add("b")
+    asyncio.run(index.ensure_ready())
+    assert index._data == ["a", "b"]
+
+    index.during_load = None
+    index.add("c")
+    assert index._data == ["a", "b", "c"]
+    assert index.rebuilds == 1
+
+
+def test_a_failed_rebuild_keeps_the_data():
+    index = ListIndex(["a"])
+    asyncio.run(index.ensure_ready())
+
+    def fail():
+        raise RuntimeError("database is down")
+
+    index.during_load = fail
+    with pytest.raises(RuntimeError):
+        asyncio.run(index.rebuild())
+    index.add("b")
+    assert index._data == ["a", "b"]
+    assert index._changes is None
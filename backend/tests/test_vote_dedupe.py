@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+from services import vote_dedupe
+from services.vote_dedupe import BloomFilter, RotatingBloomFilter, VoteDeduplicator
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    bloom = BloomFilter(10000, 0.01)
+    for i in range(10000):
+        bloom.add(f"added {i}".encode())
+    assert all(f"added {i}".encode() in bloom for i in range(10000))
+    false_positives = sum(f"other {i}".encode() in bloom for i in range(10000))
+    assert false_positives < 200
+    assert bloom.error_rate() < 0.02
+
+
+def test_keys_are_remembered_for_one_to_two_windows(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(vote_dedupe.time, "monotonic", lambda: now[0])
+    seen = RotatingBloomFilter(window=60, capacity=1000, error_rate=0.001)
+    assert seen.add_if_missing(b"key")
+    assert not seen.add_if_missing(b"key")
+    now[0] += 61
+    assert not seen.add_if_missing(b"key")
+    now[0] += 61
+    assert seen.add_if_missing(b"key")
+    assert seen.rotations == 2
+
+
+def test_full_filters_rotate_early():
+    seen = RotatingBloomFilter(window=3600, capacity=10, error_rate=0.001)
+    for i in range(25):
+        seen.add_if_missing(str(i).encode())
+    assert seen.rotations == 2
+
+
+def request(address):
+    return SimpleNamespace(
+        headers=SimpleNamespace(getlist=lambda name: [address]), client=None
+    )
+
+
+def test_votes_are_deduplicated_per_address_and_paraphrase():
+    deduplicator = VoteDeduplicator()
+    assert deduplicator.admit(request("1.1.1.1"), "a")
+    assert not deduplicator.admit(request("1.1.1.1"), "a")
+    assert deduplicator.admit(request("1.1.1.1"), "b")
+    assert deduplicator.admit(request("2.2.2.2"), "a")
+    assert deduplicator.stats()["rejected"] == 1
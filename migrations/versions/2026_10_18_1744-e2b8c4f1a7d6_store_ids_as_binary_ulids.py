@@ -0,0 +1,119 @@
+"""store ids as binary ulids
+
+Revision ID: e2b8c4f1a7d6
+Revises: c7e1f4a2d9b3
+Create Date: 2026-10-18 17:44:31.208115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from ulid import base32
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b8c4f1a7d6'
+down_revision = 'c7e1f4a2d9b3'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+# the id columns of each table, the primary key first
+ID_COLUMNS = {
+    'inputs': ['id'],
+    'paraphrases': ['id', 'input_id'],
+    'archived_inputs': ['id'],
+    'archived_paraphrases': ['id', 'input_id'],
+}
+FOREIGN_KEYS = {
+    'paraphrases': 'inputs',
+    'archived_paraphrases': 'archived_inputs',
+}
+
+
+def _convert(table, columns, suffix, convert):
+    # fills <column><suffix> from <column> a batch at a time in primary key
+    # order; writes to the tables must be stopped while this runs
+    bind = op.get_bind()
+    select_batch = sa.text(
+        f"SELECT {', '.join(columns)} FROM {table} "
+        "WHERE :last_id IS NULL OR id > :last_id ORDER BY id LIMIT :limit"
+    )
+    update_row = sa.text(
+        f"UPDATE {table} SET "
+        + ", ".join(f"{column}{suffix} = :{column}" for column in columns)
+        + " WHERE id = :id_old"
+    )
+    last_id = None
+    while True:
+        rows = bind.execute(
+            select_batch, {'last_id': last_id, 'limit': BATCH_SIZE}
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            update_row,
+            [
+                dict(
+                    {column: convert(value) for column, value in zip(columns, row)},
+                    id_old=row[0],
+                )
+                for row in rows
+            ],
+        )
+        last_id = rows[-1][0]
+
+
+def _replace_columns(table, columns, suffix, column_type):
+    # swaps the converted columns in for the old ones
+    changes = ['DROP PRIMARY KEY']
+    position = 'FIRST'
+    for column in columns:
+        changes.append(f'DROP COLUMN {column}')
+        changes.append(
+            f'CHANGE {column}{suffix} {column} {column_type} NOT NULL {position}'
+        )
+        position = f'AFTER {column}'
+    changes.append('ADD PRIMARY KEY (id)')
+    op.execute(f"ALTER TABLE {table} {', '.join(changes)}")
+
+
+def _migrate_ids(suffix, column_type, convert):
+    inspector = sa.inspect(op.get_bind())
+    for table in FOREIGN_KEYS:
+        for foreign_key in inspector.get_foreign_keys(table):
+            op.drop_constraint(foreign_key['name'], table, type_='foreignkey')
+    op.drop_index(op.f('ix_archived_paraphrases_input_id'), table_name='archived_paraphrases')
+    op.drop_index(op.f('ix_paraphrases_input_id'), table_name='paraphrases')
+    op.drop_index('ix_inputs_deleted_at_vote_count_id', table_name='inputs')
+    op.drop_index('ix_inputs_deleted_at_created_at_id', table_name='inputs')
+
+    for table, columns in ID_COLUMNS.items():
+        for column in columns:
+            op.add_column(table, sa.Column(f'{column}{suffix}', column_type, nullable=True))
+        _convert(table, columns, suffix, convert)
+        _replace_columns(
+            table, columns, suffix, column_type.compile(dialect=op.get_bind().dialect)
+        )
+
+    op.create_index('ix_inputs_deleted_at_created_at_id', 'inputs', ['deleted_at', 'created_at', 'id'], unique=False)
+    op.create_index('ix_inputs_deleted_at_vote_count_id', 'inputs', ['deleted_at', 'vote_count', 'id'], unique=False)
+    op.create_index(op.f('ix_paraphrases_input_id'), 'paraphrases', ['input_id'], unique=False)
+    op.create_index(op.f('ix_archived_paraphrases_input_id'), 'archived_paraphrases', ['input_id'], unique=False)
+    for table, referred_table in FOREIGN_KEYS.items():
+        op.create_foreign_key(None, table, referred_table, ['input_id'], ['id'])
+
+
+def upgrade() -> None:
+    # the 26 character ULID strings become their 16 bytes, which sort in the
+    # same order
+    _migrate_ids('_bin', sa.BINARY(16), base32.decode_ulid)
+
+
+def downgrade() -> None:
+    _migrate_ids(
+        '_str',
+        sqlmodel.sql.sqltypes.AutoString(length=33),
+        lambda value: base32.encode_ulid(value).lower(),
+    )
@@ -0,0 +1,97 @@
+"""add content views
+
+Revision ID: f4a9d3b7c2e5
+Revises: e2b8c4f1a7d6
+Create Date: 2026-10-18 19:02:47.915320
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from ulid import base32
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4a9d3b7c2e5'
+down_revision = 'e2b8c4f1a7d6'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def _backfill():
+    # renders the views of the existing contents a batch at a time in primary
+    # key order, as repositories.content does for new ones
+    bind = op.get_bind()
+    select_inputs = sa.text(
+        "SELECT id, who, what, detail, created_at, deleted_at FROM inputs "
+        "WHERE :last_id IS NULL OR id > :last_id ORDER BY id LIMIT :limit"
+    )
+    select_paraphrases = sa.text(
+        "SELECT input_id, id, content FROM paraphrases "
+        "WHERE input_id IN :input_ids ORDER BY input_id, id"
+    ).bindparams(sa.bindparam('input_ids', expanding=True))
+    insert_views = sa.text(
+        "INSERT INTO content_views (id, payload, created_at, deleted_at) "
+        "VALUES (:id, :payload, :created_at, :deleted_at)"
+    )
+    last_id = None
+    while True:
+        inputs = bind.execute(
+            select_inputs, {'last_id': last_id, 'limit': BATCH_SIZE}
+        ).all()
+        if not inputs:
+            break
+        paraphrases = {}
+        for input_id, id, content in bind.execute(
+            select_paraphrases, {'input_ids': [input.id for input in inputs]}
+        ):
+            paraphrases.setdefault(input_id, []).append(
+                [base32.encode_ulid(id).lower(), content]
+            )
+        bind.execute(
+            insert_views,
+            [
+                {
+                    'id': input.id,
+                    'payload': json.dumps(
+                        {
+                            'who': input.who,
+                            'what': input.what,
+                            'detail': input.detail,
+                            'paraphrases': paraphrases.get(input.id, []),
+                        },
+                        ensure_ascii=False,
+                        separators=(',', ':'),
+                    ),
+                    'created_at': input.created_at,
+                    'deleted_at': input.deleted_at,
+                }
+                for input in inputs
+            ],
+        )
+        last_id = inputs[-1].id
+
+
+def upgrade() -> None:
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('content_views',
+    sa.Column('id', sa.BINARY(length=16), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('deleted_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_content_views_deleted_at_created_at_id', 'content_views', ['deleted_at', 'created_at', 'id'], unique=False)
+    # ### end Alembic commands ###
+    _backfill()
+
+
+def downgrade() -> None:
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_index('ix_content_views_deleted_at_created_at_id', table_name='content_views')
+    op.drop_table('content_views')
+    # ### end Alembic commands ###